@@ -0,0 +1,77 @@
+import functools
+import sys
+from decimal import InvalidOperation
+
+from beancount.core.number import Decimal, ZERO
+
+# Currency codes repeat on every row; interning makes them share one string
+# object across all the Amounts of a statement.
+intern_currency = sys.intern
+
+
+@functools.lru_cache(maxsize=None)
+def exponent(places: int) -> Decimal:
+    return Decimal(1).scaleb(-places)
+
+
+def quantize(number: Decimal, places: int = 2) -> Decimal:
+    return number.quantize(exponent(places))
+
+
+def minor_units(number: Decimal, places: int = 2) -> int:
+    """`number` as an int of 10**-places units, like cents for places=2.
+
+    Raises ValueError if that drops digits.
+    """
+    units = number.scaleb(places)
+    integral = int(units)
+    if integral != units:
+        raise ValueError("{} has more than {} decimals".format(number, places))
+    return integral
+
+
+def separators(example: str):
+    """Returns (thousands, decimal) as used in e.g. "1.234,56" or "1'234.56"."""
+    found = [char for char in example.lstrip("+-") if not char.isdigit()]
+    if not found:
+        return "", "."
+    if len(set(found)) == 1:
+        return "", found[0]
+    return found[0], found[-1]
+
+
+def amount_parser(example: str = "-1234.50", lenient: bool = False):
+    """Returns a function parsing amounts written like `example` to Decimals.
+
+    The separators are worked out once, so parsing a well-formed value is
+    at most two str.replace() calls and the Decimal constructor. Empty
+    values are zero. Malformed values raise ValueError, or are zero too
+    with lenient=True, which is what DecimalOrZero used to do.
+    """
+    thousands, decimal = separators(example)
+    if decimal == ".":
+        decimal = ""
+
+    def parse(value: str) -> Decimal:
+        if not value:
+            return ZERO
+        if thousands:
+            value = value.replace(thousands, "")
+        if decimal:
+            value = value.replace(decimal, ".")
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            if lenient:
+                return ZERO
+            raise ValueError(
+                "Invalid amount {!r} for format {!r}".format(value, example)
+            )
+
+    return parse
+
+
+parse_plain = amount_parser("-1234.50")
+parse_german = amount_parser("1.234,56")
+parse_swiss = amount_parser("1'234.56")
+parse_english = amount_parser("-1,234.50")
@@ -0,0 +1,24 @@
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def replace(path, mode="w", suffix=""):
+    """Yields a file to write the new content of `path` to.
+
+    The file is a temporary one in the same directory, created if need be,
+    and only replaces `path` once the block is done: readers see the old
+    content or the new one, never half of it. If the block raises, the
+    temporary file is removed and `path` left as it was.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    try:
+        with os.fdopen(fd, mode) as out:
+            yield out
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,243 @@
+"""Statement rows held in NumPy columns instead of one Transaction each.
+
+A TransactionBatch keeps the Records of a statement (see streaming.Record)
+as arrays: dates as datetime64[D], amounts, balances and fees as int64
+minor units, and currencies, payees, narrations and categories as codes
+into one table of interned strings. Totals, balance checks and filters run
+over whole columns; Transactions are only built, by the importer's own
+build(), for the rows asked for:
+
+    rows = importer.extract_batch(file)
+    recent = rows.filter(rows.date >= np.datetime64("2024-01-01"))
+    print(recent.monthly_sums(), recent.balance_breaks())
+    entries = list(recent.transactions())
+
+NumPy is only needed for batch mode; importing this module without it
+works, and building a batch raises ImportError.
+"""
+import array
+import datetime
+
+from beancount.core import data
+from beancount.core.number import Decimal
+
+import streaming
+from amounts import exponent, minor_units
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Decimal places kept in the int64 columns. Amounts with more digits raise
+# ValueError; those statements need extract().
+SCALE = 2
+
+# What datetime64[D] counts days from, as a date.toordinal().
+_EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+# The code of a missing string, and the currency code of a missing Amount.
+NONE = -1
+
+
+class _Column:
+    """An Amount column being filled: minor units, exponents and currencies."""
+
+    def __init__(self, strings):
+        self.strings = strings
+        self.units = array.array("q")
+        self.exponents = array.array("b")
+        self.currencies = array.array("i")
+
+    def append(self, amount):
+        if amount is None:
+            self.units.append(0)
+            self.exponents.append(0)
+            self.currencies.append(NONE)
+            return
+        self.units.append(minor_units(amount.number, SCALE))
+        # Kept so that the Amount comes back written as it was, "12.3"
+        # rather than "12.30".
+        self.exponents.append(amount.number.as_tuple().exponent)
+        self.currencies.append(self.strings.code(amount.currency))
+
+    def arrays(self):
+        return (
+            np.array(self.units, dtype=np.int64),
+            np.array(self.exponents, dtype=np.int8),
+            np.array(self.currencies, dtype=np.int32),
+        )
+
+
+class _Strings:
+    """Interns strings, handing out one code per distinct value."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        if value is None:
+            return NONE
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class TransactionBatch:
+    """The rows of one statement, in columns.
+
+    Every column is a NumPy array with one item per row; `strings` is the
+    table the *_code columns index, NONE meaning no value. A missing
+    balance or fee has the currency code NONE.
+    """
+
+    def __init__(self, importer, filename, columns, strings):
+        self.importer = importer
+        self.filename = filename
+        self.strings = strings
+        self.columns = columns
+        for name, column in columns.items():
+            setattr(self, name, column)
+
+    @classmethod
+    def from_records(cls, importer, filename, records):
+        if np is None:
+            raise ImportError("Batch mode needs NumPy: pip install numpy")
+        strings = _Strings()
+        lineno = array.array("q")
+        days = array.array("i")
+        payee = array.array("i")
+        narration = array.array("i")
+        category = array.array("i")
+        amount, balance, fee = _Column(strings), _Column(strings), _Column(strings)
+        for record in records:
+            lineno.append(record.lineno)
+            days.append(record.date.toordinal() - _EPOCH)
+            amount.append(record.amount)
+            payee.append(strings.code(record.payee))
+            narration.append(strings.code(record.narration))
+            category.append(strings.code(record.category))
+            balance.append(record.balance)
+            fee.append(record.fee)
+        columns = {
+            "lineno": np.array(lineno, dtype=np.int64),
+            "date": np.array(days, dtype=np.int32).astype("datetime64[D]"),
+            "payee_code": np.array(payee, dtype=np.int32),
+            "narration_code": np.array(narration, dtype=np.int32),
+            "category_code": np.array(category, dtype=np.int32),
+        }
+        for name, column in [("amount", amount), ("balance", balance), ("fee", fee)]:
+            units, exponents, currencies = column.arrays()
+            columns[name] = units
+            columns[name + "_exponent"] = exponents
+            columns[name + "_currency_code"] = currencies
+        return cls(importer, filename, columns, strings.values)
+
+    def __len__(self):
+        return len(self.lineno)
+
+    def filter(self, mask):
+        """The rows where `mask`, a boolean array or indices, selects them."""
+        return TransactionBatch(
+            self.importer,
+            self.filename,
+            {name: column[mask] for name, column in self.columns.items()},
+            self.strings,
+        )
+
+    def where(self, column, predicate):
+        """A mask of the rows whose string `column`, like "narration",
+        satisfies `predicate`, which is called once per distinct value."""
+        codes = self.columns[column + "_code"]
+        table = np.fromiter(
+            (predicate(value) for value in self.strings), dtype=bool, count=len(self.strings)
+        )
+        # Missing values take the extra last slot, which is False.
+        return np.append(table, False)[codes]
+
+    def monthly_sums(self):
+        """[(month "YYYY-MM", currency, total)] of the amounts, in order."""
+        if not len(self):
+            return []
+        months = self.date.astype("datetime64[M]").astype(np.int64)
+        currencies = self.amount_currency_code.astype(np.int64)
+        keys = months * len(self.strings) + currencies
+        unique, inverse = np.unique(keys, return_inverse=True)
+        totals = np.zeros(len(unique), dtype=np.int64)
+        np.add.at(totals, inverse, self.amount)
+        return [
+            (
+                str(np.datetime64(int(key) // len(self.strings), "M")),
+                self.strings[int(key) % len(self.strings)],
+                _number(total, -SCALE),
+            )
+            for key, total in zip(unique, totals)
+        ]
+
+    def balance_breaks(self):
+        """Indices of the rows whose balance is not the previous one plus
+        the row's amount, less its fee.
+
+        Rows are compared from the oldest, whichever way the statement
+        lists them, with the last row before them giving a balance in the
+        same currency; rows without a balance, and the first of each
+        currency, are not checked. The first break is the row at which
+        reconcile.reconcile() stops for the statement's entries.
+        """
+        order = np.arange(len(self))
+        if len(self) > 1 and self.date[-1] < self.date[0]:
+            order = order[::-1]
+        charged = self.fee_currency_code == self.amount_currency_code
+        net = (self.amount - np.where(charged, self.fee, 0))[order]
+        amount_currency = self.amount_currency_code[order]
+        balance_currency = self.balance_currency_code[order]
+        balance = self.balance[order]
+        breaks = [np.array([], dtype=np.int64)]
+        for currency in np.unique(balance_currency[balance_currency != NONE]):
+            rows = np.flatnonzero(balance_currency == currency)
+            # What moved between two balanced rows, the rows without a
+            # balance in between included.
+            moved = np.cumsum(np.where(amount_currency == currency, net, 0))
+            expected = balance[rows[:-1]] + moved[rows[1:]] - moved[rows[:-1]]
+            breaks.append(order[rows[1:][balance[rows[1:]] != expected]])
+        return np.sort(np.concatenate(breaks))
+
+    def record(self, i):
+        """The streaming.Record of row `i`."""
+        return streaming.Record(
+            int(self.lineno[i]),
+            datetime.date.fromordinal(int(self.date[i].astype(np.int64)) + _EPOCH),
+            self._amount("amount", i),
+            self._string("payee", i),
+            self._string("narration", i),
+            self._string("category", i),
+            self._amount("balance", i),
+            self._amount("fee", i),
+        )
+
+    def transactions(self, mask=None):
+        """Yields the Transactions of the rows `mask` selects, or all rows."""
+        rows = range(len(self)) if mask is None else np.flatnonzero(mask)
+        for i in rows:
+            yield self.importer.build(self.record(i), self.filename)
+
+    def _string(self, column, i):
+        code = self.columns[column + "_code"][i]
+        return None if code == NONE else self.strings[code]
+
+    def _amount(self, column, i):
+        currency = self.columns[column + "_currency_code"][i]
+        if currency == NONE:
+            return None
+        return data.Amount(
+            _number(self.columns[column][i], int(self.columns[column + "_exponent"][i])),
+            self.strings[currency],
+        )
+
+
+def _number(units, places):
+    """The Decimal of `units` minor units, written with `places` as exponent."""
+    return Decimal(int(units)).scaleb(-SCALE).quantize(exponent(-places))
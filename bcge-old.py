@@ -1,5 +1,6 @@
 import datetime
 import decimal
+import functools
 import os
 import re
 
@@ -14,6 +15,78 @@ from beancount_import.matching import FIXME_ACCOUNT
 from beancount_import.source import ImportResult, Source, InvalidSourceReference, SourceResults, AssociatedData, LogFunction, description_based_source
 from beancount_import.journal_editor import JournalEditor
 
+import dates
+import journalindex
+import metrics
+from dates import DateParser
+import parallel
+from parsecache import ParsedFileCache, source_version
+
+# Namespace -> (document element, report element, path from a related party
+# to its name). camt.054 notifications carry entries like camt.053
+# statements; version .08 wraps party details in Pty.
+CAMT_VERSIONS = {
+    'urn:iso:std:iso:20022:tech:xsd:camt.053.001.02': ('BkToCstmrStmt', 'Stmt', 'camt:Nm'),
+    'urn:iso:std:iso:20022:tech:xsd:camt.053.001.04': ('BkToCstmrStmt', 'Stmt', 'camt:Nm'),
+    'urn:iso:std:iso:20022:tech:xsd:camt.053.001.08': ('BkToCstmrStmt', 'Stmt', 'camt:Pty/camt:Nm'),
+    'urn:iso:std:iso:20022:tech:xsd:camt.054.001.02': ('BkToCstmrDbtCdtNtfctn', 'Ntfctn', 'camt:Nm'),
+    'urn:iso:std:iso:20022:tech:xsd:camt.054.001.04': ('BkToCstmrDbtCdtNtfctn', 'Ntfctn', 'camt:Nm'),
+    'urn:iso:std:iso:20022:tech:xsd:camt.054.001.08': ('BkToCstmrDbtCdtNtfctn', 'Ntfctn', 'camt:Pty/camt:Nm'),
+}
+
+
+class CamtQueries:
+    """The XPath expressions of one CAMT version, compiled once."""
+
+    def __init__(self, namespace):
+        try:
+            document, report, party_name = CAMT_VERSIONS[namespace]
+        except KeyError:
+            raise ValueError('Unsupported CAMT namespace: {}'.format(namespace))
+
+        def xpath(path):
+            return etree.XPath(path, namespaces={'camt': namespace})
+
+        ns = '{%s}' % namespace
+        self.report_tag = ns + report
+        self.ntry_tag = ns + 'Ntry'
+        self.bal_tag = ns + 'Bal'
+
+        self.reports = xpath('/camt:Document/camt:{}/camt:{}'.format(document, report))
+        self.ntrys = xpath('./camt:Ntry')
+        self.balances = xpath('./camt:Bal')
+        self.amt = xpath('./camt:Amt')
+        self.bal_date = xpath('./camt:Dt/camt:Dt')
+        self.booking_date = xpath('./camt:BookgDt/camt:Dt/text()')
+        self.tx_dtls = xpath('./camt:NtryDtls/camt:TxDtls')
+        self.ntry_refs = xpath('./camt:AcctSvcrRef/text()')
+        self.tx_refs = xpath('.//camt:AcctSvcrRef/text()')
+        self.subtypes = xpath('./camt:BkTxCd/camt:Domn/camt:Fmly/camt:SubFmlyCd/text()')
+        self.credit_debit = xpath('./camt:CdtDbtInd')
+        self.debtor_names = xpath('./camt:RltdPties/camt:Dbtr/{}/text()'.format(party_name))
+        self.creditor_names = xpath('./camt:RltdPties/camt:Cdtr/{}/text()'.format(party_name))
+        self.addtl_tx_inf = xpath('./camt:AddtlTxInf/text()')
+        self.instr_id = xpath('./camt:Refs/camt:InstrId/text()')
+
+
+@functools.lru_cache(maxsize=None)
+def queries_for(namespace):
+    return CamtQueries(namespace)
+
+
+# What AddtlTxInf says about a card payment, cash withdrawal or Twint
+# transfer. Only tried on descriptions with the matching prefix.
+MAESTRO_PAYEE = re.compile(
+    r'Maestro purchase [0-9]{2}.[0-9]{2}.[0-9]{4} [0-9]{2}:[0-9]{2} (.*) Card number: .*')
+CASH_PLACE = re.compile(
+    r'Cash Point [0-9]{2}.[0-9]{2}.[0-9]{4} [0-9]{2}:[0-9]{2} (.*) Card number: .*')
+TWINT_PAYEE = re.compile(r'Twint (.*) [0-9]+')
+
+
+def root_namespace(filename):
+    for _, root in etree.iterparse(filename, events=('start',)):
+        return etree.QName(root).namespace
+
 
 class BCGECAMTSource(description_based_source.DescriptionBasedSource):
     def __init__(self, directory: str,
@@ -21,6 +94,10 @@ class BCGECAMTSource(description_based_source.DescriptionBasedSource):
                  salary_account: str,
                  fees_account: str,
                  atm_account: str,
+                 cache_dir: str = None,
+                 streaming: bool = False,
+                 workers: int = 1,
+                 index_path: str = None,
                  **kwargs):
         super(BCGECAMTSource, self).__init__(**kwargs)
         self.account = account
@@ -28,8 +105,15 @@ class BCGECAMTSource(description_based_source.DescriptionBasedSource):
         self.fees_account = fees_account
         self.atm_account = atm_account
         self.directory = directory
-        self.xpathkwargs = {'namespaces': {
-            'camt': 'urn:iso:std:iso:20022:tech:xsd:camt.053.001.04'}}
+        self.streaming = streaming
+        self.workers = workers
+        self.index_path = index_path
+        self.cache = None
+        if cache_dir:
+            self.cache = ParsedFileCache(
+                cache_dir,
+                source_version(__file__, dates.__file__,
+                               params=(account, salary_account, atm_account)))
 
     @property
     def name(self) -> str:
@@ -37,42 +121,110 @@ class BCGECAMTSource(description_based_source.DescriptionBasedSource):
 
     def prepare(self, journal: JournalEditor, results: SourceResults) -> None:
         results.add_account(self.account)
-        seen_txns = set()
-        skipped_entries = 0
-        for entry in journal.all_entries:
-            if not isinstance(entry, Transaction):
-                skipped_entries += 1
-                continue
-            seen_txns.add(entry.meta.get('txn_id'))
-        print("{} entries in seen set, {} skipped".format(
-            len(seen_txns), skipped_entries))
+        seen_txns = journalindex.seen_ids(journal, 'txn_id', self.index_path)
+        metrics.file_stats(self, None).count('seen_ids', len(seen_txns))
 
-        new_entries = []
-        for filename in os.listdir(self.directory):
-            new_entries.extend(self.handle_file(
-                os.path.join(self.directory, filename)))
+        for path, entries in self._parsed_files():
+            stats = metrics.file_stats(self, path)
+            with stats.phase('parse'):
+                entries = stats.collect(entries)
+            for entry in entries:
+                if not isinstance(entry, Transaction):
+                    continue
+                if entry.meta.get('txn_id') in seen_txns:
+                    stats.skip('in journal')
+                else:
+                    stats.count('entries')
+                    results.add_pending_entry(ImportResult(date=entry.date, entries=[entry], info={
+                                              'type': 'application/camt', 'filename': 'whokows'}))
 
-        for entry in new_entries:
-            if not isinstance(entry, Transaction):
-                continue
-            if not entry.meta.get('txn_id') in seen_txns:
-                results.add_pending_entry(ImportResult(date=entry.date, entries=[entry], info={
-                                          'type': 'application/camt', 'filename': 'whokows'}))
+    def _parsed_files(self):
+        paths = [os.path.join(self.directory, filename)
+                 for filename in sorted(os.listdir(self.directory))]
+        if self.cache is None and self.workers <= 1 and self.streaming:
+            # Nothing to store or send between processes: keep the
+            # one-entry-at-a-time memory profile of iter_file().
+            return ((path, self.iter_file(path)) for path in paths)
+        return parallel.parse_files(paths, self._parser(), self.workers, self.cache)
+
+    def _parser(self):
+        return functools.partial(parse_file, account=self.account,
+                                 salary_account=self.salary_account,
+                                 atm_account=self.atm_account,
+                                 streaming=self.streaming)
 
     # def is_posting_cleared(self, posting, *args, **kwargs):
-    #    return posting.
+    #    return posting.
 
     def handle_file(self, filename):
+        return self._parser()(filename)
+
+    def iter_file(self, filename):
+        return CamtFile(filename, self.account, self.salary_account, self.atm_account).iter_entries()
+
+
+def parse_file(filename, account, salary_account, atm_account, streaming=False):
+    """Returns the entries of one CAMT file.
+
+    Depends on its arguments only, so it can be handed to a process pool.
+    """
+    camt_file = CamtFile(filename, account, salary_account, atm_account)
+    if streaming:
+        return list(camt_file.iter_entries())
+    return camt_file.entries()
+
+
+class CamtFile:
+    """The parsing state of one CAMT file: its queries and entry counter."""
+
+    def __init__(self, filename, account, salary_account, atm_account):
         self.filename = filename
+        self.account = account
+        self.salary_account = salary_account
+        self.atm_account = atm_account
         self.entry_counter = 0
-        doc = etree.parse(filename)
+        self.parse_date = DateParser('%Y-%m-%d')
+        self.queries = None
+        self.stats = metrics.file_stats(self, filename)
+
+    def entries(self):
+        doc = etree.parse(self.filename)
+        self.queries = queries_for(etree.QName(doc.getroot()).namespace)
         entries = []
-        stmts = doc.xpath(
-            '/camt:Document/camt:BkToCstmrStmt/camt:Stmt', **self.xpathkwargs)
-        for stmt in stmts:
+        for stmt in self.queries.reports(doc):
             entries.extend(self._handle_stmt(stmt))
         return entries
 
+    def iter_entries(self):
+        """Yields the same entries as entries() without building a DOM.
+
+        Each Ntry is handled as soon as iterparse completes it, then cleared
+        and dropped from the tree along with its preceding siblings, so memory
+        is bounded by one entry instead of the whole statement. Balances are
+        read as they come but emitted when their Stmt ends, which keeps the
+        order and lineno of _handle_stmt().
+        """
+        self.queries = queries_for(root_namespace(self.filename))
+        stmt_tag = self.queries.report_tag
+        ntry_tag = self.queries.ntry_tag
+        bal_tag = self.queries.bal_tag
+        balances = []
+        for _, elem in etree.iterparse(self.filename, events=('end',), tag=(stmt_tag, ntry_tag, bal_tag)):
+            parent = elem.getparent()
+            if elem.tag == stmt_tag:
+                for date, units in balances:
+                    yield Balance(self.get_meta(), date, self.account, units, None, None)
+                balances = []
+            elif parent.tag != stmt_tag:
+                continue
+            elif elem.tag == ntry_tag:
+                yield from self._handle_ntry(self.account, elem)
+            else:
+                balances.append(self._read_balance(elem))
+            elem.clear(keep_tail=True)
+            while elem.getprevious() is not None:
+                del parent[0]
+
     def get_meta(self, txn_id=None):
         meta = OrderedDict()
         meta['filename'] = self.filename
@@ -85,23 +237,24 @@ class BCGECAMTSource(description_based_source.DescriptionBasedSource):
 
     def _handle_balance(self, account, bal):
         meta = self.get_meta()
-        amt = bal.xpath('./camt:Amt', **self.xpathkwargs)[0]
-        units = amount.Amount(decimal.Decimal(amt.text), amt.attrib['Ccy'])
-        date_string = bal.xpath('./camt:Dt/camt:Dt', **
-                                self.xpathkwargs)[0].text
-        date = datetime.datetime.strptime(date_string, '%Y-%m-%d').date()
+        date, units = self._read_balance(bal)
         return Balance(meta, date, account, units, None, None)
 
+    def _read_balance(self, bal):
+        amt = self.queries.amt(bal)[0]
+        units = amount.Amount(decimal.Decimal(amt.text), amt.attrib['Ccy'])
+        date = self.parse_date(self.queries.bal_date(bal)[0].text)
+        return date, units
+
     def _handle_tx(self, account, date, tx, entry_txn_id=None):
+        queries = self.queries
+        subtypes = queries.subtypes(tx)
         txn_id = None
         if entry_txn_id:
             txn_id = entry_txn_id
         else:
-            txn_ids = tx.xpath('.//camt:AcctSvcrRef/text()',
-                               **self.xpathkwargs)
+            txn_ids = queries.tx_refs(tx)
             if not txn_ids:
-                subtypes = tx.xpath(
-                    './camt:BkTxCd/camt:Domn/camt:Fmly/camt:SubFmlyCd/text()', **self.xpathkwargs)
                 if subtypes and subtypes[0] == 'SALA':
                     txn_ids = ['SALA-{}'.format(date.isoformat())]
                 else:
@@ -109,10 +262,9 @@ class BCGECAMTSource(description_based_source.DescriptionBasedSource):
                         'Transaction has no ref: {}'.format(etree.tostring(tx)))
             txn_id = txn_ids[0]
         meta = self.get_meta(txn_id)
-        amt = tx.xpath('./camt:Amt', **self.xpathkwargs)[0]
+        amt = queries.amt(tx)[0]
         units = amount.Amount(decimal.Decimal(amt.text), amt.attrib['Ccy'])
-        credit = tx.xpath('./camt:CdtDbtInd', **
-                          self.xpathkwargs)[0].text == 'CRDT'
+        credit = queries.credit_debit(tx)[0].text == 'CRDT'
         if not credit:
             units = -units
 
@@ -120,37 +272,30 @@ class BCGECAMTSource(description_based_source.DescriptionBasedSource):
         text = ''
         dest_account = FIXME_ACCOUNT
 
-        counterparty_names = tx.xpath('./camt:RltdPties/camt:{}/camt:Nm/text()'.format(
-            'Dbtr' if credit else 'Cdtr'), **self.xpathkwargs)
-        subtypes = tx.xpath(
-            './camt:BkTxCd/camt:Domn/camt:Fmly/camt:SubFmlyCd/text()', **self.xpathkwargs)
-
-        txinf = tx.xpath('./camt:AddtlTxInf/text()', **self.xpathkwargs)
-        ntryinf = tx.xpath('./camt:AddtlTxInf/text()', **self.xpathkwargs)
-        inf = txinf or ntryinf
-
-        instrid = tx.xpath(
-            './camt:Refs/camt:InstrId/text()', **self.xpathkwargs)
+        if credit:
+            counterparty_names = queries.debtor_names(tx)
+        else:
+            counterparty_names = queries.creditor_names(tx)
+        inf = queries.addtl_tx_inf(tx)
+        instrid = queries.instr_id(tx)
 
         if subtypes and subtypes[0] == 'SALA':
             dest_account = self.salary_account
             text = 'Salary'
         elif inf and inf[0].startswith('Maestro purchase'):
             text = inf[0]
-            maestro_match = re.match(
-                r'Maestro purchase [0-9]{2}.[0-9]{2}.[0-9]{4} [0-9]{2}:[0-9]{2} (.*) Card number: .*', inf[0])
+            maestro_match = MAESTRO_PAYEE.match(inf[0])
             if maestro_match:
                 payee = maestro_match.group(1)
         elif inf and inf[0].startswith('Cash Point'):
             text = 'ATM Withdrawal: {}'.format(inf[0])
-            cash_match = re.match(
-                r'Cash Point [0-9]{2}.[0-9]{2}.[0-9]{4} [0-9]{2}:[0-9]{2} (.*) Card number: .*', inf[0])
+            cash_match = CASH_PLACE.match(inf[0])
             if cash_match:
                 text = 'ATM Withdrawal: {}'.format(cash_match.group(1))
             dest_account = self.atm_account
         elif inf and inf[0].startswith('Twint '):
             text = inf[0]
-            twint_match = re.match(r'Twint (.*) [0-9]+', inf[0])
+            twint_match = TWINT_PAYEE.match(inf[0])
             if twint_match:
                 payee = twint_match.group(1)
             else:
@@ -173,11 +318,10 @@ class BCGECAMTSource(description_based_source.DescriptionBasedSource):
         ])
 
     def _handle_ntry(self, account, ntry):
-        date_string = ntry.xpath(
-            './camt:BookgDt/camt:Dt/text()', **self.xpathkwargs)[0]
-        date = datetime.datetime.strptime(date_string, '%Y-%m-%d').date()
-        tx_dtls = ntry.xpath('./camt:NtryDtls/camt:TxDtls', **self.xpathkwargs)
-        refs = ntry.xpath('./camt:AcctSvcrRef/text()', **self.xpathkwargs)
+        self.stats.count('rows')
+        date = self.parse_date(self.queries.booking_date(ntry)[0])
+        tx_dtls = self.queries.tx_dtls(ntry)
+        refs = self.queries.ntry_refs(ntry)
         kwargs = {}
         if refs and len(tx_dtls) == 1:
             kwargs['entry_txn_id'] = refs[0]
@@ -189,13 +333,11 @@ class BCGECAMTSource(description_based_source.DescriptionBasedSource):
     def _handle_stmt(self, stmt):
         entries = []
 
-        ntrys = stmt.xpath('./camt:Ntry', **self.xpathkwargs)
-        for ntry in ntrys:
+        for ntry in self.queries.ntrys(stmt):
             entries.extend(self._handle_ntry(self.account, ntry))
 
-        balances = stmt.xpath('./camt:Bal', **self.xpathkwargs)
         entries.extend(self._handle_balance(self.account, bal)
-                       for bal in balances)
+                       for bal in self.queries.balances(stmt))
 
         return entries
 
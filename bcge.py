@@ -5,9 +5,15 @@ from beancount.core.data import Transaction
 from beancount.core.data import Posting
 from beancount.core import data
 from beancount.core.amount import Amount
-from beancount.ingest import importer
 from beancount.core.number import Decimal
 
+import metrics
+import signatures
+from amounts import amount_parser
+from dates import DateParser
+from schema import RowSchema
+from streaming import Record, StreamingImporter
+
 import pdb
 
 
@@ -15,22 +21,13 @@ class InvalidFormatError(Exception):
     pass
 
 
-def fmt_number_de(value: str) -> Decimal:
-    thousands_sep = "."
-    decimal_sep = ","
-
-    return Decimal(value.replace(thousands_sep, "").replace(decimal_sep, "."))
-
+parse_amount = amount_parser(lenient=True)
 
-def DecimalOrZero(value):
-    # for string to number conversion with empty strings
-    try:
-        return Decimal(value)
-    except:
-        return Decimal(0.0)
 
+class BcgeImporter(StreamingImporter):
+    schema = RowSchema("Date", "Amount", "Posting text")
+    signature = signatures.CsvHeader(schema.columns, line=11, delimiter=";")
 
-class BcgeImporter(importer.ImporterProtocol):
     def __init__(self, account, currency="CHF", file_encoding="cp1252", manual_fixes=0):
 
         self.account = account
@@ -55,10 +52,10 @@ class BcgeImporter(importer.ImporterProtocol):
         return datetime.now
 
     def identify(self, file):
-        return "bcge" in file.name and file.name.endswith(".csv")
+        return signatures.identify(self, file)
 
-    def extract(self, file, existing_entries=None):
-        entries = []
+    def records(self, file):
+        stats = metrics.file_stats(self, file)
         with open(file.name, encoding=self.file_encoding) as fd:
 
             reader = csv.reader(fd, delimiter=self.delimiter)
@@ -68,38 +65,46 @@ class BcgeImporter(importer.ImporterProtocol):
                 next(reader)
 
             header = next(reader)
-            print(header)
 
-            amount_index = header.index("Amount")
-            date_index = header.index("Date")
-            description_index = header.index("Posting text")
+            fields = self.schema.compile(header)
+            parse_date = DateParser("%d.%m.%y")
 
             # Data entries
-            for i, row in enumerate(reader):
+            for i, row in enumerate(stats.rows(reader)):
                 if len(row) == 0:  # "end" of bank statment
                     break
 
-                meta = data.new_metadata(file.name, i)
-                date = datetime.strptime(row[date_index], "%d.%m.%y").date()
-                amount = Amount(DecimalOrZero(row[amount_index]), self.currency)
-                description = row[description_index]
+                date_value, amount_value, description = fields(row)
 
-                trans = Transaction(
-                    meta,
-                    date,
-                    self.FLAG,
+                yield Record(
+                    i,
+                    parse_date(date_value),
+                    Amount(parse_amount(amount_value), self.currency),
                     "",
                     description,
-                    data.EMPTY_SET,
-                    data.EMPTY_SET,
-                    [],
-                )
-                trans.postings.append(
-                    Posting(self.account, amount, None, None, None, None)
-                )
-                trans.postings.append(
-                    Posting("Expenses:TBD", -amount, None, None, None, None)
+                    None,
+                    None,
+                    None,
                 )
-                entries.append(trans)
 
-        return entries
+    def build(self, record, filename):
+        meta = data.new_metadata(filename, record.lineno)
+        amount = record.amount
+
+        trans = Transaction(
+            meta,
+            record.date,
+            self.FLAG,
+            record.payee,
+            record.narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [],
+        )
+        trans.postings.append(
+            Posting(self.account, amount, None, None, None, None)
+        )
+        trans.postings.append(
+            Posting("Expenses:TBD", -amount, None, None, None, None)
+        )
+        return trans
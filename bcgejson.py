@@ -1,4 +1,3 @@
-import json
 import re
 from datetime import datetime
 
@@ -6,13 +5,33 @@ from beancount.core.data import Transaction
 from beancount.core.data import Posting
 from beancount.core import data
 from beancount.core.amount import Amount
-from beancount.ingest import importer
 from beancount.core.number import Decimal
 
+import jsonstream
+import metrics
+import signatures
+import watermarks
+from amounts import intern_currency, quantize
+from dates import DateParser
+from streaming import Record, StreamingImporter
 
-# https://www.bcge.ch/next/api/v3/accounts/.../transactions/2025/01
-class BcgeImporter(importer.ImporterProtocol):
-    def __init__(self, account, currency="CHF", file_encoding="utf-8", manual_fixes=0):
+# Whitespace-separated numbers, like references, that make otherwise equal
+# descriptions differ.
+_NUMBERS = re.compile(r"(?<!\S)\d+(?!\S)")
+
+
+# https://www.bcge.ch/next/api/v3/accounts/.../transactions/2025/01, see fetch.py.
+class BcgeImporter(StreamingImporter):
+    signature = signatures.JsonKey("data")
+
+    def __init__(
+        self,
+        account,
+        currency="CHF",
+        file_encoding="utf-8",
+        manual_fixes=0,
+        watermark_path=None,
+    ):
 
         self.account = account
         self.currency = currency
@@ -29,6 +48,14 @@ class BcgeImporter(importer.ImporterProtocol):
         self.tags = {
             "Saldovortrag": {"EN": "Balance brought forward", "DE": "Saldovortrag"}
         }
+        # With a store, rows up to the last imported bookingDate are skipped,
+        # as are whole month files before it.
+        self.watermark_store = None
+        if watermark_path:
+            self.watermark_store = watermarks.WatermarkStore(watermark_path)
+        # File name -> (newest date, its row keys) read by records(), saved
+        # to the store once extract() has returned.
+        self._marks = {}
 
     def name(self):
         return "Bcge {}".format(self.__class__.__name__)
@@ -40,33 +67,53 @@ class BcgeImporter(importer.ImporterProtocol):
         return datetime.now
 
     def identify(self, file):
-        return "bcge" in file.name and file.name.endswith(".json")
-
-    def extract(self, file, existing_entries=None):
-        entries = []
+        return signatures.identify(self, file)
+
+    def records(self, file):
+        stats = metrics.file_stats(self, file)
+        store = self.watermark_store
+        watermark = store.get(self.account) if store is not None else None
+        newest, newest_keys = None, []
+        previous, newest_first = None, None
         with open(file.name, encoding=self.file_encoding) as fd:
+            parse_date = DateParser("%Y-%m-%dT%H:%M:%S.000Z")
+            for i, row in enumerate(stats.rows(jsonstream.iter_array(fd, "data"))):
+                date = parse_date(row["bookingDate"])
+                if i == 0 and watermark is not None and watermark.covers_month(date):
+                    # Exports are monthly, see fetch.py, so the first row
+                    # dates the whole file.
+                    stats.count("skipped_files")
+                    return
+
+                if store is not None:
+                    key = watermarks.row_key(row)
+                    if newest is None or date > newest:
+                        newest, newest_keys = date, [key]
+                    elif date == newest:
+                        newest_keys.append(key)
+                    if previous is not None and date > previous:
+                        newest_first = False
+                    elif previous is not None and date < previous and newest_first is None:
+                        newest_first = True
+                    previous = date
+                    if watermark is not None and not watermark.is_new(date, key):
+                        stats.skip("before watermark")
+                        if newest_first and date < watermark.date:
+                            # Listed newest first: the rest is older still.
+                            break
+                        continue
 
-            reader = json.load(fd)
-            for i, row in enumerate(reader["data"]):
-                date = datetime.strptime(
-                    row["bookingDate"], "%Y-%m-%dT%H:%M:%S.000Z"
-                ).date()
-
-                is_positive = Decimal(1.0) if row["type"] == "CREDIT" else Decimal(-1.0)
-                amount = Amount(
-                    is_positive
-                    * Decimal(row["amount"]["value"]).quantize(Decimal("0.01")),
-                    row["amount"]["currency"],
-                )
+                number = quantize(Decimal(row["amount"]["value"]))
+                if row["type"] != "CREDIT":
+                    number = -number
+                amount = Amount(number, intern_currency(row["amount"]["currency"]))
 
                 if "notification" in row and len(row["notification"]) > 1:
                     description = " ".join(row["notification"])
                 else:
                     description = row["description"]
 
-                description = " ".join(
-                    x for x in description.split() if not re.match(r"^\d+$", x)
-                )
+                description = " ".join(_NUMBERS.sub("", description).split())
 
                 def extractPayee(row):
                     if "senderAddress" in row and row["senderAddress"]:
@@ -80,71 +127,84 @@ class BcgeImporter(importer.ImporterProtocol):
                         return ""
 
                 payee = extractPayee(row)
-                metadata = {}
 
-                if amount.number > 0:
-                    if amount.number > 10000 and payee == "GOOGLE SWITZERLAND GMBH":
-                        continue
-                    trans = Transaction(
-                        data.new_metadata(file.name, i, metadata),
-                        date,
-                        self.FLAG,
-                        payee,
-                        description,
-                        data.EMPTY_SET,
-                        data.EMPTY_SET,
-                        [
-                            Posting(
-                                "Income:TBD",
-                                -amount,
-                                None,
-                                None,
-                                None,
-                                None,
-                            ),
-                            Posting(self.account, amount, None, None, None, None),
-                        ],
-                    )
-                    entries.append(trans)
+                if amount.number > 10000 and payee == "GOOGLE SWITZERLAND GMBH":
+                    stats.skip("salary")
+                    continue
+                yield Record(i, date, amount, payee, description, None, None, None)
 
-                else:
-                    trans = Transaction(
-                        data.new_metadata(file.name, i, metadata),
-                        date,
-                        self.FLAG,
-                        payee,
-                        description,
-                        data.EMPTY_SET,
-                        data.EMPTY_SET,
-                        [
-                            Posting(self.account, amount, None, None, None, None),
-                            Posting("Expenses:TBD", -amount, None, None, None, None),
-                        ],
-                    )
-
-                    # if "serviceFees" in row:
-                    #     serviceFees = row["serviceFees"]
-                    #     assert all(
-                    #         x["currency"] == serviceFees[0]["currency"]
-                    #         for x in serviceFees
-                    #     ), "All service fees must have the same currency"
-                    #     fee_amount = Amount(
-                    #         Decimal(
-                    #             sum((Decimal(x["amount"])) for x in serviceFees)
-                    #         ).quantize(Decimal("0.01")),
-                    #         serviceFees[0]["currency"],
-                    #     )
-                    #     trans.postings.append(
-                    #         Posting(
-                    #             "Expenses:Financial:Fees",
-                    #             fee_amount,
-                    #             None,
-                    #             None,
-                    #             None,
-                    #             None,
-                    #         )
-                    #     )
-                    #
-                    entries.append(trans)
+        if store is not None and newest is not None:
+            self._marks[file.name] = (newest, newest_keys)
 
+    def extract(self, file, existing_entries=None):
+        entries = super().extract(file, existing_entries)
+        # Not before: if extracting fails, the rows are read again next run.
+        mark = self._marks.pop(file.name, None)
+        if mark is not None:
+            self.watermark_store.advance(self.account, *mark)
         return entries
+
+    def build(self, record, filename):
+        amount = record.amount
+        metadata = {}
+
+        if amount.number > 0:
+            return Transaction(
+                data.new_metadata(filename, record.lineno, metadata),
+                record.date,
+                self.FLAG,
+                record.payee,
+                record.narration,
+                data.EMPTY_SET,
+                data.EMPTY_SET,
+                [
+                    Posting(
+                        "Income:TBD",
+                        -amount,
+                        None,
+                        None,
+                        None,
+                        None,
+                    ),
+                    Posting(self.account, amount, None, None, None, None),
+                ],
+            )
+
+        trans = Transaction(
+            data.new_metadata(filename, record.lineno, metadata),
+            record.date,
+            self.FLAG,
+            record.payee,
+            record.narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [
+                Posting(self.account, amount, None, None, None, None),
+                Posting("Expenses:TBD", -amount, None, None, None, None),
+            ],
+        )
+
+        # if "serviceFees" in row:
+        #     serviceFees = row["serviceFees"]
+        #     assert all(
+        #         x["currency"] == serviceFees[0]["currency"]
+        #         for x in serviceFees
+        #     ), "All service fees must have the same currency"
+        #     fee_amount = Amount(
+        #         Decimal(
+        #             sum((Decimal(x["amount"])) for x in serviceFees)
+        #         ).quantize(Decimal("0.01")),
+        #         serviceFees[0]["currency"],
+        #     )
+        #     trans.postings.append(
+        #         Posting(
+        #             "Expenses:Financial:Fees",
+        #             fee_amount,
+        #             None,
+        #             None,
+        #             None,
+        #             None,
+        #         )
+        #     )
+        #
+        return trans
@@ -0,0 +1,95 @@
+"""Per-format micro-benchmark of the old amount helpers vs amounts.py.
+
+Run from the repository root:
+
+    python -m benchmarks.amounts --values=200000
+"""
+import locale
+import random
+import re
+import timeit
+
+from absl import app
+from absl import flags
+from beancount.core.number import D, Decimal
+
+from amounts import parse_english, parse_german, parse_plain, parse_swiss
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer("values", 200000, "Amounts parsed per format.")
+flags.DEFINE_integer("repeat", 3, "Timing runs per parser; the best one counts.")
+
+
+def decimal_or_zero(value):
+    try:
+        return Decimal(value)
+    except:
+        return Decimal(0.0)
+
+
+def fmt_number_de(value):
+    return Decimal(value.replace(".", "").replace(",", "."))
+
+
+def atof_chf(value):
+    return locale.atof(re.sub(r"[\s']", "", value), Decimal)
+
+
+def values(fmt, count):
+    rng = random.Random(0)
+    for _ in range(count):
+        number = rng.randrange(-10000000, 10000000)
+        units, cents = divmod(abs(number), 100)
+        sign = "-" if number < 0 else ""
+        yield fmt.format(sign=sign, units=units, cents=cents)
+
+
+FORMATS = [
+    # name, format, old parser, new parser
+    ("-1234.50", "{sign}{units}.{cents:02d}", decimal_or_zero, parse_plain),
+    (
+        "1.234,56",
+        "{sign}{units:,}.{cents:02d}",
+        lambda value: decimal_or_zero(fmt_number_de(value)),
+        parse_german,
+    ),
+    ("1'234.56", "{sign}{units:,}.{cents:02d}", atof_chf, parse_swiss),
+    (
+        "-1,234.50",
+        "{sign}{units:,}.{cents:02d}",
+        lambda value: D(value.replace(",", "")),
+        parse_english,
+    ),
+]
+# Python's format mini-language only groups with ','; swap in each style.
+SEPARATORS = {"1.234,56": (".", ","), "1'234.56": ("'", ".")}
+
+
+def main(argv):
+    del argv
+    for name, fmt, old, new in FORMATS:
+        samples = list(values(fmt, FLAGS.values))
+        if name in SEPARATORS:
+            thousands, decimal = SEPARATORS[name]
+            table = str.maketrans({",": thousands, ".": decimal})
+            samples = [value.translate(table) for value in samples]
+        assert [old(value) for value in samples[:1000]] == [
+            new(value) for value in samples[:1000]
+        ]
+        for label, fn in [("old", old), ("amounts.py", new)]:
+            best = min(
+                timeit.repeat(
+                    lambda: [fn(value) for value in samples],
+                    number=1,
+                    repeat=FLAGS.repeat,
+                )
+            )
+            print(
+                "{:<10} {:<13} {:>12,.0f} values/sec".format(
+                    name, label, len(samples) / best
+                )
+            )
+
+
+if __name__ == "__main__":
+    app.run(main)
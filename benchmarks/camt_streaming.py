@@ -0,0 +1,79 @@
+"""Checks the iterparse CAMT path against the DOM path and compares memory.
+
+Each mode parses every file in a fresh worker process, which consumes the
+entries one at a time into a digest and reports its peak RSS. The script
+fails if the two modes produce different entries, and then shows the first
+entry that differs. Run from the repository root:
+
+    python -m benchmarks.camt_streaming statements/*.xml
+"""
+import concurrent.futures
+import hashlib
+import importlib
+import resource
+
+from absl import app
+
+camt = importlib.import_module("bcge-old")
+
+
+def make_source(streaming):
+    return camt.BCGECAMTSource(
+        directory=None,
+        account="Assets:Bank",
+        salary_account="Income:Salary",
+        fees_account="Expenses:Fees",
+        atm_account="Assets:Cash",
+        streaming=streaming,
+        log_status=None,
+    )
+
+
+def digest(filename, streaming):
+    source = make_source(streaming)
+    if streaming:
+        entries = source.iter_file(filename)
+    else:
+        entries = source.handle_file(filename)
+    count = 0
+    sha = hashlib.sha256()
+    for entry in entries:
+        sha.update(repr(entry).encode("utf-8"))
+        count += 1
+    return count, sha.hexdigest(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def in_worker(fn, *args):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def first_difference(filename):
+    dom_entries = make_source(streaming=False).handle_file(filename)
+    stream_entries = list(make_source(streaming=True).iter_file(filename))
+    for i, (a, b) in enumerate(zip(dom_entries, stream_entries)):
+        if a != b:
+            return "entry {} differs:\n{}\n{}".format(i, a, b)
+    return "{} entries from the DOM path, {} streamed".format(
+        len(dom_entries), len(stream_entries)
+    )
+
+
+def main(argv):
+    filenames = argv[1:]
+    if not filenames:
+        raise app.UsageError("Pass one or more camt.053 files.")
+    for filename in filenames:
+        dom_count, dom_digest, dom_rss = in_worker(digest, filename, False)
+        count, stream_digest, stream_rss = in_worker(digest, filename, True)
+        if (dom_count, dom_digest) != (count, stream_digest):
+            raise AssertionError("{}: {}".format(filename, first_difference(filename)))
+        print(
+            "{}: {} entries identical, peak RSS {:,} KiB DOM / {:,} KiB streaming".format(
+                filename, count, dom_rss, stream_rss
+            )
+        )
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,133 @@
+"""Rows/sec of per-row header.index() lookups vs a compiled RowSchema.
+
+Run from the repository root:
+
+    python -m benchmarks.csob_schema --rows=1000000
+"""
+import csv
+import os
+import random
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+
+from schema import RowSchema
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer("rows", 1000000, "Rows in the synthetic CSOB export.")
+
+HEADER = [
+    "account number",
+    "due date",
+    "amount",
+    "currency",
+    "balance",
+    "counter account",
+    "bank code",
+    "counter account name",
+    "constant symbol",
+    "variable symbol",
+    "specific symbol",
+    "transaction identification",
+    "message",
+    "note",
+]
+COLUMNS = (
+    "due date",
+    "amount",
+    "currency",
+    "balance",
+    "note",
+    "counter account name",
+    "counter account",
+)
+
+
+def write_export(path, rows):
+    rng = random.Random(0)
+    with open(path, "w", encoding="UTF-8", newline="") as fd:
+        writer = csv.writer(fd, delimiter=";")
+        writer.writerow(["x"])
+        writer.writerow(["y"])
+        writer.writerow(HEADER)
+        for i in range(rows):
+            writer.writerow(
+                [
+                    "123456789",
+                    "{:02d}.{:02d}.2024".format(i % 28 + 1, i % 12 + 1),
+                    "-{},{:02d}".format(rng.randrange(10000), rng.randrange(100)),
+                    "CZK",
+                    "10.000,00",
+                    "1112003761" if i % 50 == 0 else "987654321",
+                    "0300",
+                    "Payee {}".format(i % 1000),
+                    "",
+                    "",
+                    "",
+                    str(i),
+                    "",
+                    "Place: Praha {} ".format(i % 100),
+                ]
+            )
+
+
+def read_header_index(path):
+    # The row loop as CSOBImporter had it: every field looked up by name.
+    with open(path, encoding="UTF-8") as fd:
+        reader = csv.reader(fd, delimiter=";")
+        next(reader)
+        next(reader)
+        header = next(reader)
+        for row in reader:
+            (
+                row[header.index("due date")],
+                row[header.index("amount")],
+                row[header.index("currency")],
+                row[header.index("balance")],
+                row[header.index("currency")],
+                row[header.index("note")],
+                row[header.index("counter account name")],
+                row[header.index("counter account")],
+            )
+
+
+def read_compiled(path):
+    with open(path, encoding="UTF-8") as fd:
+        reader = csv.reader(fd, delimiter=";")
+        next(reader)
+        next(reader)
+        fields = RowSchema(*COLUMNS).compile(next(reader))
+        for row in reader:
+            fields(row)
+
+
+def read_only(path):
+    # Baseline: the cost of csv.reader itself.
+    with open(path, encoding="UTF-8") as fd:
+        reader = csv.reader(fd, delimiter=";")
+        for row in reader:
+            pass
+
+
+def main(argv):
+    del argv
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "csob.csv")
+        write_export(path, FLAGS.rows)
+        for name, fn in [
+            ("csv.reader only", read_only),
+            ("header.index per row", read_header_index),
+            ("compiled RowSchema", read_compiled),
+        ]:
+            start = time.perf_counter()
+            fn(path)
+            elapsed = time.perf_counter() - start
+            print(
+                "{:<22} {:>12,.0f} rows/sec".format(name, FLAGS.rows / elapsed)
+            )
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,166 @@
+"""Runs fetch.Fetcher against a local stand-in for the BCGE transactions API.
+
+The server answers /accounts/<account>/transactions/<year>/<month> with a
+synthetic month, honours If-None-Match and If-Modified-Since, keeps
+connections alive and waits --latency_ms before each response, like a
+remote API would. Account "expired" gets an HTML login page instead.
+
+The script checks that a first run downloads every month and that the
+files are what the server sent and are identified by the importer. It
+then checks that a second run downloads nothing and that the login page
+replaces no statement. It reports wall time and connections opened for
+one worker and for --workers. Run from the repository root:
+
+    python -m benchmarks.fetch --months=24 --account_count=3 --workers=8
+"""
+import email.utils
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import time
+
+from absl import app
+from absl import flags
+from beancount.ingest import cache
+
+import fetch
+from bcgejson import BcgeImporter
+from benchmarks import synthetic
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer("months", 24, "Months per account.")
+flags.DEFINE_integer("account_count", 3, "Accounts to fetch.")
+flags.DEFINE_integer("latency_ms", 20, "Delay before each response.")
+# --rows (per month) and --workers (of the concurrent run) are those of
+# benchmarks.synthetic and fetch.
+
+LAST_MODIFIED = email.utils.formatdate(0, usegmt=True)
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, documents):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.documents = documents
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; do not wait for an ACK.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(FLAGS.latency_ms / 1000)
+        if self.path.startswith("/accounts/expired/"):
+            return self._send(200, b"<html><body>Please log in</body></html>", "text/html")
+        body = self.server.documents.get(self.path)
+        if body is None:
+            return self._send(404, b"")
+        etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+        if self.headers.get("If-None-Match", etag) == etag and self.headers.get(
+            "If-Modified-Since", LAST_MODIFIED) == LAST_MODIFIED and (
+                "If-None-Match" in self.headers or "If-Modified-Since" in self.headers):
+            return self._send(304, None, etag=etag)
+        self._send(200, body, "application/json", etag=etag)
+
+    def _send(self, status, body, content_type=None, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if body is not None:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+def make_documents(directory):
+    documents = {}
+    path = os.path.join(directory, "month.json")
+    for account in range(FLAGS.account_count):
+        for month in range(1, FLAGS.months + 1):
+            synthetic.write_bcgejson(path, FLAGS.rows, seed=account * 1000 + month)
+            with open(path, "rb") as fd:
+                year, month_of_year = 2020 + (month - 1) // 12, (month - 1) % 12 + 1
+                url_path = "/accounts/{}/transactions/{}/{:02d}".format(
+                    account, year, month_of_year)
+                documents[url_path] = fd.read()
+    return documents
+
+
+def run(server, directory, workers):
+    jobs = [
+        fetch.Job(
+            server.base_url + url_path,
+            os.path.join(directory, url_path.lstrip("/").replace("/transactions", "") + ".json"),
+        )
+        for url_path in sorted(server.documents)
+    ]
+    fetcher = fetch.Fetcher(
+        fetch.FetchState(os.path.join(directory, ".fetch-state.json")),
+        signature=BcgeImporter.signature,
+        workers=workers,
+    )
+    server.connections = 0
+    start = time.perf_counter()
+    results = fetcher.fetch(jobs)
+    return results, time.perf_counter() - start, server.connections
+
+
+def main(argv):
+    del argv
+    with tempfile.TemporaryDirectory() as directory:
+        server = StandInServer(make_documents(directory))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        importer = BcgeImporter("Assets:BCGE")
+        for workers in [1, FLAGS.workers]:
+            output = os.path.join(directory, "out{}".format(workers))
+            for label, expected in [("cold", "fetched"), ("warm", "unchanged")]:
+                results, seconds, connections = run(server, output, workers)
+                outcomes = {outcome for _, outcome in results}
+                assert outcomes == {expected}, outcomes
+                print("{:>2} workers {}: {:>3} months in {:6.2f}s over {} connections".format(
+                    workers, label, len(results), seconds, connections))
+            for job, _ in results:
+                with open(job.path, "rb") as fd:
+                    assert fd.read() == server.documents[job.url[len(server.base_url):]]
+                assert importer.identify(cache.get_file(job.path)), job.path
+
+        statement = os.path.join(directory, "expired.json")
+        with open(statement, "w") as fd:
+            fd.write('{"data": []}')
+        job = fetch.Job(server.base_url + "/accounts/expired/transactions/2020/01", statement)
+        fetcher = fetch.Fetcher(fetch.FetchState(os.path.join(directory, "state.json")),
+                                signature=BcgeImporter.signature)
+        [(_, outcome)] = fetcher.fetch([job])
+        assert isinstance(outcome, fetch.FetchError), outcome
+        with open(statement) as fd:
+            assert fd.read() == '{"data": []}'
+        assert os.listdir(directory).count("expired.json") == 1
+        assert not [name for name in os.listdir(directory) if name.endswith(".part")]
+        print("login page rejected: {}".format(outcome))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,245 @@
+"""Rows/sec, peak RSS and scaling of every importer's extract path.
+
+For each format and size a synthetic statement is written (see
+benchmarks.synthetic) and extracted in a fresh worker process, so every
+run starts from the same cache-free state and reports its own peak RSS.
+Between consecutive sizes the growth exponent of the run time is fitted;
+anything above --max_exponent is flagged as super-linear. Run from the
+repository root:
+
+    python -m benchmarks.scaling --formats=csob,camt --output=scaling.json
+
+With --baseline pointing at the JSON of an earlier run, the rows/sec of
+both are compared. --mode=batch times extract_batch() and the monthly sums
+and balance check over its columns instead, for the StreamingImporter
+formats, after checking that the balance check flags the same row as
+reconcile.py does over the entries; it needs NumPy.
+"""
+import concurrent.futures
+import datetime
+import importlib
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+from beancount.ingest import cache
+
+import reconcile
+from benchmarks import synthetic
+
+FLAGS = flags.FLAGS
+flags.DEFINE_list("formats", list(synthetic.FORMATS), "Formats to run.")
+flags.DEFINE_list("sizes", ["1000", "10000", "100000", "1000000"], "Rows per statement.")
+flags.DEFINE_integer("repeat", 3, "Runs per format and size; the fastest one counts.")
+flags.DEFINE_float(
+    "max_exponent", 1.2, "Growth exponent of the run time above which scaling is flagged."
+)
+flags.DEFINE_string("output", None, "Where to write the results as JSON.")
+flags.DEFINE_string("baseline", None, "Results JSON of an earlier run to compare with.")
+flags.DEFINE_boolean("strict", False, "Exit with an error if any scaling is flagged.")
+flags.DEFINE_enum("mode", "extract", ["extract", "batch"], "Which path to time.")
+
+FORMAT_VERSION = 1
+
+# Format -> (module, importer class) of the beancount.ingest importers.
+IMPORTERS = {
+    "revolut": ("revolut", "RevolutImporter"),
+    "wise": ("wise", "WiseImporter"),
+    "neon": ("neon", "NeonImporter"),
+    "bcge": ("bcge", "BcgeImporter"),
+    "csob": ("csob", "CSOBImporter"),
+    "fio": ("fio", "FioImporter"),
+    "chase": ("chase", "ChaseBankImporter"),
+    "bcgejson": ("bcgejson", "BcgeImporter"),
+    "viseca": ("viseca", "VisecaImporter"),
+}
+# The DescriptionBasedSource formats, parsed by a module-level function.
+MODULES = {"camt": "bcge-old", "ib": "ib"}
+
+
+def extract(name, path):
+    """The entries of the statement at `path`, the way bean-extract gets them."""
+    if name == "camt":
+        camt = importlib.import_module("bcge-old")
+        return camt.parse_file(path, "Assets:BCGE", "Income:Salary", "Assets:Cash", streaming=True)
+    if name == "ib":
+        return importlib.import_module("ib").parse_statement(path, "Assets:IB")
+    module, cls = IMPORTERS[name]
+    importer = getattr(importlib.import_module(module), cls)("Assets:Bank")
+    return importer.extract(cache.get_file(path), None)
+
+
+def extract_batch(name, path):
+    """The rows of the statement at `path` as a batch, summed and checked."""
+    module, cls = IMPORTERS[name]
+    importer = getattr(importlib.import_module(module), cls)("Assets:Bank")
+    rows = importer.extract_batch(cache.get_file(path))
+    rows.monthly_sums()
+    rows.balance_breaks()
+    return rows
+
+
+def check_balances(name, path):
+    """Raises unless balance_breaks() of the batch starts at the row that
+    reconcile.reconcile() stops at for the entries built from it."""
+    module, cls = IMPORTERS[name]
+    importer = getattr(importlib.import_module(module), cls)("Assets:Bank")
+    rows = importer.extract_batch(cache.get_file(path))
+    entries = list(rows.transactions())
+    mismatch = reconcile.reconcile(entries, importer.account).mismatch
+    breaks = set(rows.balance_breaks().tolist())
+    first = next((i for i in reconcile.chronological(entries) if i in breaks), None)
+    expected = mismatch.index if mismatch else None
+    if first != expected:
+        raise AssertionError(
+            "{}: balance_breaks() starts at row {}, reconcile() at {}".format(
+                name, first, expected
+            )
+        )
+
+
+def measure(name, path, mode="extract"):
+    # Imports happen before the clock starts: they are not per-row work.
+    importlib.import_module(MODULES.get(name) or IMPORTERS[name][0])
+    if mode == "batch":
+        importlib.import_module("numpy")
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    entries = len((extract_batch if mode == "batch" else extract)(name, path))
+    seconds = time.perf_counter() - start
+    return entries, seconds, rss_before, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def in_worker(fn, *args):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def run(name, rows, directory):
+    path = synthetic.write(name, directory, rows)
+    try:
+        if FLAGS.mode == "batch":
+            in_worker(check_balances, name, path)
+        runs = [in_worker(measure, name, path, FLAGS.mode) for _ in range(FLAGS.repeat)]
+    finally:
+        os.remove(path)
+    entries, seconds, rss_before, peak_rss = min(runs, key=lambda run: run[1])
+    return {
+        "format": name,
+        "mode": FLAGS.mode,
+        "rows": rows,
+        "entries": entries,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds,
+        "rss_before_kib": rss_before,
+        "peak_rss_kib": peak_rss,
+    }
+
+
+def scaling(results):
+    """The run time growth exponent between each pair of consecutive sizes."""
+    found = []
+    for a, b in zip(results, results[1:]):
+        exponent = math.log(b["seconds"] / a["seconds"]) / math.log(b["rows"] / a["rows"])
+        found.append(
+            {
+                "format": a["format"],
+                "from_rows": a["rows"],
+                "to_rows": b["rows"],
+                "exponent": exponent,
+                "superlinear": exponent > FLAGS.max_exponent,
+            }
+        )
+    return found
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as fd:
+        baseline = json.load(fd)
+    before = {(r["format"], r["rows"]): r["rows_per_sec"] for r in baseline["results"]}
+    print("\nvs {} ({})".format(baseline_path, baseline.get("commit")))
+    for result in results:
+        key = (result["format"], result["rows"])
+        if key in before:
+            print(
+                "{:<9} {:>9,} rows {:>+8.1%}".format(
+                    key[0], key[1], result["rows_per_sec"] / before[key] - 1
+                )
+            )
+
+
+def main(argv):
+    del argv
+    unknown = set(FLAGS.formats) - set(synthetic.FORMATS)
+    if unknown:
+        raise app.UsageError("Unknown formats: {}".format(", ".join(sorted(unknown))))
+    if FLAGS.mode == "batch" and set(FLAGS.formats) - set(IMPORTERS):
+        raise app.UsageError("--mode=batch only runs the formats of {}".format(
+            ", ".join(IMPORTERS)))
+    sizes = sorted(int(size) for size in FLAGS.sizes)
+    results = []
+    steps = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in FLAGS.formats:
+            runs = []
+            for rows in sizes:
+                result = run(name, rows, directory)
+                runs.append(result)
+                print(
+                    "{:<9} {:>9,} rows {:>9,} entries {:>10,.0f} rows/sec "
+                    "peak RSS {:>9,} KiB".format(
+                        name,
+                        rows,
+                        result["entries"],
+                        result["rows_per_sec"],
+                        result["peak_rss_kib"],
+                    )
+                )
+            results.extend(runs)
+            for step in scaling(runs):
+                steps.append(step)
+                if step["superlinear"]:
+                    print(
+                        "{:<9} SUPER-LINEAR {:,} -> {:,} rows: time grows as n^{:.2f}".format(
+                            name, step["from_rows"], step["to_rows"], step["exponent"]
+                        )
+                    )
+    report = {
+        "format": FORMAT_VERSION,
+        "commit": git_commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "max_exponent": FLAGS.max_exponent,
+        "results": results,
+        "scaling": steps,
+    }
+    if FLAGS.output:
+        with open(FLAGS.output, "w") as fd:
+            json.dump(report, fd, indent=2)
+            fd.write("\n")
+    if FLAGS.baseline:
+        compare(results, FLAGS.baseline)
+    flagged = [step for step in steps if step["superlinear"]]
+    if flagged and FLAGS.strict:
+        raise SystemExit("{} super-linear steps".format(len(flagged)))
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,668 @@
+"""Synthetic statements in every format the importers read.
+
+Each writer takes a path and a row count and streams a statement of that
+size to disk, so a million-row file costs no more memory than a small one.
+Rows are drawn from a seeded random.Random: the same arguments always give
+the same file. Dates spread over ten years whatever the size, in order,
+and the balance columns carry a consistent running balance.
+
+To write a sample of every format into a directory:
+
+    python -m benchmarks.synthetic --rows=1000 --output_dir=/tmp/statements
+"""
+import collections
+import csv
+import datetime
+import json
+import os
+import random
+
+from absl import app
+from absl import flags
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer("rows", 1000, "Rows per statement.")
+flags.DEFINE_string("output_dir", None, "Directory the statements are written to.")
+flags.DEFINE_integer("seed", 0, "Seed of the row generator.")
+
+START = datetime.date(2015, 1, 1)
+SPAN_DAYS = 3650
+
+MERCHANTS = [
+    "Coop",
+    "Migros",
+    "SBB CFF FFS",
+    "Lidl",
+    "Albert",
+    "Starbucks",
+    "Amazon",
+    "Galaxus",
+    "Denner",
+    "Kafe Slavia",
+    "Uber",
+    "Apple",
+]
+CITIES = ["Zurich", "Basel", "Geneve", "Praha", "Brno", "New York", "Bern"]
+PEOPLE = ["Jana Novak", "Peter Muller", "Anna Rossi", "John Smith"]
+CATEGORIES = ["groceries", "transport", "restaurants", "shopping", "income"]
+
+
+def _dates(rows):
+    for i in range(rows):
+        yield i, START + datetime.timedelta(days=i * SPAN_DAYS // max(rows, 1))
+
+
+def _amount(rng):
+    """Mostly card payments, now and then an incoming transfer."""
+    if rng.random() < 0.1:
+        return round(rng.uniform(100, 5000), 2)
+    return -round(rng.uniform(1, 300), 2)
+
+
+def _merchant(rng):
+    return "{} {}".format(rng.choice(MERCHANTS), rng.choice(CITIES))
+
+
+def _german(number):
+    # 1234.5 -> "1.234,50"
+    return "{:,.2f}".format(number).replace(",", " ").replace(".", ",").replace(" ", ".")
+
+
+def _csv_writer(fd, delimiter=","):
+    return csv.writer(fd, delimiter=delimiter, lineterminator="\n")
+
+
+def write_revolut(path, rows, seed=0):
+    rng = random.Random(seed)
+    balance = 1000.0
+    with open(path, "w", encoding="utf-8", newline="") as fd:
+        writer = _csv_writer(fd)
+        writer.writerow(
+            [
+                "Type",
+                "Product",
+                "Started Date",
+                "Completed Date",
+                "Description",
+                "Amount",
+                "Fee",
+                "Currency",
+                "State",
+                "Balance",
+            ]
+        )
+        for _, date in _dates(rows):
+            number = _amount(rng)
+            state = "COMPLETED" if rng.random() < 0.97 else "REVERTED"
+            fee = 0.5 if rng.random() < 0.05 else 0.0
+            if state == "COMPLETED":
+                balance += number - fee
+            started = "{} {:02d}:{:02d}:00".format(date, rng.randrange(24), rng.randrange(60))
+            writer.writerow(
+                [
+                    "CARD_PAYMENT" if number < 0 else "TOPUP",
+                    "Current",
+                    started,
+                    started,
+                    _merchant(rng) if number < 0 else "Top-Up by *1234",
+                    "{:.2f}".format(number),
+                    "{:.2f}".format(fee),
+                    "CHF",
+                    state,
+                    "{:.2f}".format(balance) if state == "COMPLETED" else "",
+                ]
+            )
+
+
+def write_wise(path, rows, seed=0):
+    rng = random.Random(seed)
+    balance = 1000.0
+    with open(path, "w", encoding="utf-8", newline="") as fd:
+        writer = _csv_writer(fd)
+        writer.writerow(
+            [
+                "TransferWise ID",
+                "Date",
+                "Amount",
+                "Currency",
+                "Description",
+                "Payment Reference",
+                "Running Balance",
+                "Exchange From",
+                "Exchange To",
+                "Exchange Rate",
+                "Payer Name",
+                "Payee Name",
+                "Payee Account Number",
+                "Merchant",
+                "Card Last Four Digits",
+                "Card Holder Full Name",
+                "Attachment",
+                "Note",
+                "Total fees",
+                "Exchange To Amount",
+            ]
+        )
+        for i, date in _dates(rows):
+            number = _amount(rng)
+            fee = 1.2 if rng.random() < 0.1 else 0.0
+            balance += number - fee
+            if number > 0:
+                description = "Received money from {}".format(rng.choice(PEOPLE))
+            elif rng.random() < 0.7:
+                description = "Card transaction of {:.2f} CHF issued by {}".format(
+                    -number, _merchant(rng).upper()
+                )
+            else:
+                description = "Sent money to {}".format(rng.choice(PEOPLE))
+            writer.writerow(
+                [
+                    "CARD-{}".format(i),
+                    date.strftime("%d-%m-%Y"),
+                    "{:.2f}".format(number),
+                    "CHF",
+                    description,
+                    "",
+                    "{:.2f}".format(balance),
+                ]
+                + [""] * 11
+                + ["{:.2f}".format(fee), ""]
+            )
+
+
+def write_neon(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as fd:
+        writer = _csv_writer(fd, ";")
+        writer.writerow(
+            [
+                "Date",
+                "Amount",
+                "Original amount",
+                "Original currency",
+                "Exchange rate",
+                "Description",
+                "Subject",
+                "Category",
+                "Tags",
+                "Wise",
+                "Spaces",
+            ]
+        )
+        for _, date in _dates(rows):
+            number = _amount(rng)
+            writer.writerow(
+                [
+                    date.isoformat(),
+                    "{:.2f}".format(number),
+                    "",
+                    "",
+                    "",
+                    _merchant(rng),
+                    "",
+                    "income" if number > 0 else rng.choice(CATEGORIES[:-1]),
+                    "",
+                    "no",
+                    "no",
+                ]
+            )
+        writer.writerow([])
+
+
+def write_bcge(path, rows, seed=0):
+    rng = random.Random(seed)
+    balance = 10000.0
+    with open(path, "w", encoding="cp1252", newline="") as fd:
+        writer = _csv_writer(fd, ";")
+        writer.writerow(["Kontoauszug", ""])
+        writer.writerow(["IBAN", "CH93 0076 2011 6238 5295 7"])
+        writer.writerow(["Kontoinhaber", "Max Müller"])
+        for line in range(8):
+            writer.writerow(["Info {}".format(line), ""])
+        writer.writerow(["Date", "Posting text", "Amount", "Balance", "Value date"])
+        for _, date in _dates(rows):
+            number = _amount(rng)
+            balance += number
+            value_date = date.strftime("%d.%m.%y")
+            writer.writerow(
+                [
+                    value_date,
+                    "Einkauf {} Zürich".format(rng.choice(MERCHANTS)),
+                    "{:.2f}".format(number),
+                    "{:.2f}".format(balance),
+                    value_date,
+                ]
+            )
+        writer.writerow([])
+
+
+def write_csob(path, rows, seed=0):
+    rng = random.Random(seed)
+    balance = 100000.0
+    with open(path, "w", encoding="UTF-8", newline="") as fd:
+        writer = _csv_writer(fd, ";")
+        writer.writerow(["Pohyby na účtu", ""])
+        writer.writerow(["123456789/0300", ""])
+        writer.writerow(
+            [
+                "account number",
+                "due date",
+                "amount",
+                "currency",
+                "balance",
+                "counter account",
+                "bank code",
+                "counter account name",
+                "constant symbol",
+                "variable symbol",
+                "specific symbol",
+                "transaction identification",
+                "message",
+                "note",
+            ]
+        )
+        for i, date in _dates(rows):
+            number = _amount(rng) * 20
+            balance += number
+            card = rng.random() < 0.6
+            writer.writerow(
+                [
+                    "123456789",
+                    date.strftime("%d.%m.%Y"),
+                    _german(number),
+                    "CZK",
+                    _german(balance),
+                    "1112003761" if card else "987654321",
+                    "0300",
+                    "" if card else rng.choice(PEOPLE),
+                    "",
+                    str(rng.randrange(10**6)),
+                    "",
+                    str(i),
+                    "",
+                    "Purchase Place: {} CZ".format(rng.choice(MERCHANTS)) if card else "",
+                ]
+            )
+        writer.writerow([])
+
+
+def write_fio(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8-sig", newline="") as fd:
+        writer = _csv_writer(fd, ";")
+        for label in [
+            "accountId",
+            "bankId",
+            "currency",
+            "iban",
+            "bic",
+            "openingBalance",
+            "closingBalance",
+            "dateStart",
+            "dateEnd",
+        ]:
+            # FioImporter's default account_id.
+            writer.writerow([label, "2000466790" if label == "accountId" else ""])
+        writer.writerow(
+            [
+                "ID pohybu",
+                "Datum",
+                "Objem",
+                "Měna",
+                "Protiúčet",
+                "Název protiúčtu",
+                "Kód banky",
+                "Název banky",
+                "KS",
+                "VS",
+                "SS",
+                "Poznámka",
+                "Zpráva pro příjemce",
+                "Typ",
+                "Provedl",
+                "Upřesnění",
+                "Komentář",
+                "BIC",
+                "ID pokynu",
+            ]
+        )
+        for i, date in _dates(rows):
+            number = _amount(rng) * 20
+            card = number < 0 and rng.random() < 0.7
+            writer.writerow(
+                [
+                    str(i),
+                    date.strftime("%d.%m.%Y"),
+                    "{:.2f}".format(number).replace(".", ","),
+                    "CZK",
+                    "",
+                    "" if card else rng.choice(PEOPLE),
+                    "",
+                    "",
+                    "",
+                    "",
+                    "",
+                    "Nákup: {}, {}, CZ".format(rng.choice(MERCHANTS), rng.choice(CITIES))
+                    if card
+                    else "",
+                    "",
+                    "Platba kartou" if card else "Bezhotovostní platba",
+                    "Jana Novak",
+                    "",
+                    "",
+                    "",
+                    "",
+                ]
+            )
+        writer.writerow([])
+
+
+def write_chase(path, rows, seed=0):
+    rng = random.Random(seed)
+    balance = 5000.0
+    with open(path, "w", encoding="utf-8", newline="") as fd:
+        writer = _csv_writer(fd)
+        writer.writerow(
+            [
+                "Details",
+                "Posting Date",
+                "Description",
+                "Amount",
+                "Type",
+                "Balance",
+                "Check or Slip #",
+            ]
+        )
+        for _, date in _dates(rows):
+            number = _amount(rng)
+            balance += number
+            writer.writerow(
+                [
+                    "DEBIT" if number < 0 else "CREDIT",
+                    date.strftime("%m/%d/%Y"),
+                    _merchant(rng).upper(),
+                    "{:.2f}".format(number),
+                    "DEBIT_CARD" if number < 0 else "ACH_CREDIT",
+                    "{:.2f}".format(balance),
+                    "",
+                ]
+            )
+
+
+def _write_json_list(path, key, items):
+    # One object per line, so the whole document never sits in memory.
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write('{{"{}": [\n'.format(key))
+        for i, item in enumerate(items):
+            if i:
+                fd.write(",\n")
+            fd.write(json.dumps(item, ensure_ascii=False))
+        fd.write("\n]}\n")
+
+
+def write_bcgejson(path, rows, seed=0):
+    rng = random.Random(seed)
+
+    def items():
+        for _, date in _dates(rows):
+            number = _amount(rng)
+            item = {
+                "bookingDate": "{}T00:00:00.000Z".format(date),
+                "type": "CREDIT" if number > 0 else "DEBIT",
+                "amount": {"value": "{:.3f}".format(abs(number)), "currency": "CHF"},
+                "description": "Zahlung {} {} {}".format(
+                    rng.randrange(10**6), _merchant(rng), rng.randrange(1000)
+                ),
+            }
+            if number > 0:
+                item["senderAddress"] = ["/C/0013347532", rng.choice(PEOPLE)]
+            elif rng.random() < 0.5:
+                item["beneficiaryAddress"] = [_merchant(rng)]
+            if rng.random() < 0.2:
+                item["notification"] = ["Referenz", str(rng.randrange(10**9))]
+            yield item
+
+    _write_json_list(path, "data", items())
+
+
+def write_viseca(path, rows, seed=0):
+    rng = random.Random(seed)
+
+    def items():
+        for _, date in _dates(rows):
+            item = {
+                "date": "{}T{:02d}:00:00+01:00".format(date, rng.randrange(24)),
+                "amount": round(rng.uniform(1, 300), 2),
+                "currency": "CHF",
+                "details": _merchant(rng),
+                "pfmCategory": {"name": rng.choice(CATEGORIES[:-1])},
+            }
+            if rng.random() < 0.5:
+                item["prettyName"] = rng.choice(MERCHANTS)
+            if rng.random() < 0.05:
+                item["serviceFees"] = [{"amount": 1.5, "currency": "CHF"}]
+            yield item
+
+    _write_json_list(path, "list", items())
+
+
+def _camt_entry(rng, i, date):
+    kind = rng.random()
+    if kind < 0.05:
+        return (
+            '<Ntry><Amt Ccy="CHF">6500.00</Amt><CdtDbtInd>CRDT</CdtDbtInd>'
+            "<BookgDt><Dt>{date}</Dt></BookgDt><AcctSvcrRef>S{i}</AcctSvcrRef>"
+            "<BkTxCd><Domn><Fmly><SubFmlyCd>SALA</SubFmlyCd></Fmly></Domn></BkTxCd>"
+            '<NtryDtls><TxDtls><Amt Ccy="CHF">6500.00</Amt><CdtDbtInd>CRDT</CdtDbtInd>'
+            "<BkTxCd><Domn><Fmly><SubFmlyCd>SALA</SubFmlyCd></Fmly></Domn></BkTxCd>"
+            "</TxDtls></NtryDtls></Ntry>\n"
+        ).format(date=date, i=i), 6500.0
+    number = round(rng.uniform(1, 300), 2)
+    if kind < 0.6:
+        info = "Maestro purchase {:%d.%m.%Y} 12:00 {} Card number: 1234".format(
+            date, _merchant(rng)
+        )
+    elif kind < 0.8:
+        info = "Twint {} {}".format(rng.choice(PEOPLE), rng.randrange(10**6))
+    else:
+        info = "Cash Point {:%d.%m.%Y} 09:30 {} Card number: 1234".format(
+            date, rng.choice(CITIES)
+        )
+    return (
+        '<Ntry><Amt Ccy="CHF">{amount:.2f}</Amt><CdtDbtInd>DBIT</CdtDbtInd>'
+        "<BookgDt><Dt>{date}</Dt></BookgDt><AcctSvcrRef>R{i}</AcctSvcrRef>"
+        '<NtryDtls><TxDtls><Refs><AcctSvcrRef>T{i}</AcctSvcrRef></Refs>'
+        '<Amt Ccy="CHF">{amount:.2f}</Amt><CdtDbtInd>DBIT</CdtDbtInd>'
+        "<AddtlTxInf>{info}</AddtlTxInf></TxDtls></NtryDtls></Ntry>\n"
+    ).format(amount=number, date=date, i=i, info=info), -number
+
+
+def _camt_balance(code, number, date):
+    return (
+        "<Bal><Tp><CdOrPrtry><Cd>{}</Cd></CdOrPrtry></Tp>"
+        '<Amt Ccy="CHF">{:.2f}</Amt><CdtDbtInd>{}</CdtDbtInd>'
+        "<Dt><Dt>{}</Dt></Dt></Bal>\n"
+    ).format(code, abs(number), "CRDT" if number >= 0 else "DBIT", date)
+
+
+def write_camt(path, rows, seed=0):
+    """A camt.053.001.04 statement; the closing balance goes after the entries."""
+    rng = random.Random(seed)
+    opening = balance = 10000.0
+    date = START
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.04">'
+            "<BkToCstmrStmt><GrpHdr><MsgId>SYNTHETIC</MsgId></GrpHdr><Stmt><Id>1</Id>\n"
+        )
+        fd.write(_camt_balance("OPBD", opening, START))
+        for i, date in _dates(rows):
+            entry, number = _camt_entry(rng, i, date)
+            balance += number
+            fd.write(entry)
+        fd.write(_camt_balance("CLBD", balance, date))
+        fd.write("</Stmt></BkToCstmrStmt></Document>\n")
+
+
+IB_SECTIONS = [
+    ("Deposits & Withdrawals", ["Currency", "Settle Date", "Description", "Amount"]),
+    ("Fees", ["Subtitle", "Currency", "Date", "Description", "Amount"]),
+    ("Dividends", ["Currency", "Date", "Description", "Amount"]),
+    ("Withholding Tax", ["Currency", "Date", "Description", "Amount", "Code"]),
+    ("Interest", ["Currency", "Date", "Description", "Amount"]),
+    (
+        "Trades",
+        [
+            "DataDiscriminator",
+            "Asset Category",
+            "Currency",
+            "Symbol",
+            "Date/Time",
+            "Quantity",
+            "T. Price",
+            "C. Price",
+            "Proceeds",
+            "Comm/Fee",
+            "Comm in EUR",
+            "Basis",
+            "Realized P/L",
+            "MTM P/L",
+            "Code",
+        ],
+    ),
+]
+SYMBOLS = ["AAPL", "MSFT", "GOOG", "VT", "VTI", "NESN", "ROG"]
+
+
+def _ib_cash_row(section, rng, date):
+    number = round(rng.uniform(1, 500), 2)
+    if section == "Deposits & Withdrawals":
+        return ["USD", date, "Electronic Fund Transfer", number]
+    if section == "Fees":
+        return ["Other Fees", "USD", date, "Market data", -number / 100]
+    if section == "Dividends":
+        return ["USD", date, "{} Cash Dividend".format(rng.choice(SYMBOLS)), number / 10]
+    if section == "Withholding Tax":
+        return ["USD", date, "{} Tax".format(rng.choice(SYMBOLS)), -number / 100, ""]
+    return ["USD", date, "USD Debit Interest", -number / 100]
+
+
+def _ib_trade_row(rng, date, positions):
+    if rng.random() < 0.1:
+        quantity = rng.randrange(1000, 10000)
+        price = round(rng.uniform(1.05, 1.15), 4)
+        return [
+            "Order",
+            "Forex",
+            "USD",
+            "EUR.USD",
+            '{}, 10:00:00'.format(date),
+            "{:,}".format(quantity),
+            price,
+            price,
+            round(-quantity * price, 2),
+            "",
+            -2,
+            "",
+            "",
+            0,
+            "",
+        ]
+    symbol = rng.choice(SYMBOLS)
+    held = positions[symbol]
+    quantity = -rng.randrange(1, held + 1) if held and rng.random() < 0.3 else rng.randrange(1, 100)
+    positions[symbol] += quantity
+    price = round(rng.uniform(10, 500), 2)
+    return [
+        "Order",
+        "Stocks",
+        "USD",
+        symbol,
+        '{}, 10:00:00'.format(date),
+        "{:,}".format(quantity),
+        price,
+        price,
+        round(-quantity * price, 2),
+        -1,
+        "",
+        round(quantity * price, 2),
+        0,
+        0,
+        "O" if quantity > 0 else "C",
+    ]
+
+
+def write_ib(path, rows, seed=0):
+    """An activity statement with `rows` data rows spread over its sections.
+
+    Half of the rows are trades. Every section has its own header row and
+    total rows, and some skipped sections are mixed in like in the real
+    export.
+    """
+    rng = random.Random(seed)
+    sections = collections.defaultdict(list)
+    positions = collections.Counter()
+    cash_sections = [name for name, _ in IB_SECTIONS if name != "Trades"]
+    for _, date in _dates(rows):
+        if rng.random() < 0.5:
+            sections["Trades"].append(_ib_trade_row(rng, date, positions))
+        else:
+            section = rng.choice(cash_sections)
+            sections[section].append(_ib_cash_row(section, rng, date))
+    with open(path, "w", encoding="utf-8", newline="") as fd:
+        writer = _csv_writer(fd)
+        writer.writerow(["Statement", "Header", "Field Name", "Field Value"])
+        writer.writerow(["Statement", "Data", "BrokerName", "Interactive Brokers"])
+        writer.writerow(["Open Positions", "Header", "DataDiscriminator", "Asset Category", "Currency", "Symbol", "Quantity"])
+        for symbol, quantity in sorted(positions.items()):
+            writer.writerow(["Open Positions", "Data", "Summary", "Stocks", "USD", symbol, quantity])
+        for name, columns in IB_SECTIONS:
+            writer.writerow([name, "Header"] + columns)
+            for row in sections[name]:
+                writer.writerow([name, "Data"] + row)
+            if name == "Trades":
+                writer.writerow([name, "SubTotal", "", "Stocks", "USD"] + [""] * 10)
+            elif name == "Fees":
+                writer.writerow([name, "Data", "Total", "", "", "", 0])
+            else:
+                writer.writerow([name, "Data", "Total", "", "", 0] + [""] * (len(columns) - 4))
+
+
+# name -> (file name, writer)
+FORMATS = collections.OrderedDict(
+    [
+        ("revolut", ("revolut.csv", write_revolut)),
+        ("wise", ("wise.csv", write_wise)),
+        ("neon", ("neon.csv", write_neon)),
+        ("bcge", ("bcge.csv", write_bcge)),
+        ("csob", ("csob.csv", write_csob)),
+        ("fio", ("Vypis_z_uctu-2000466790.csv", write_fio)),
+        ("chase", ("chase.csv", write_chase)),
+        ("bcgejson", ("bcge.json", write_bcgejson)),
+        ("viseca", ("viseca.json", write_viseca)),
+        ("camt", ("camt053.xml", write_camt)),
+        ("ib", ("activity.csv", write_ib)),
+    ]
+)
+
+
+def write(name, directory, rows, seed=0):
+    """Writes a `rows`-row statement in format `name` into `directory`."""
+    filename, writer = FORMATS[name]
+    path = os.path.join(directory, filename)
+    writer(path, rows, seed)
+    return path
+
+
+def main(argv):
+    del argv
+    if not FLAGS.output_dir:
+        raise app.UsageError("Pass --output_dir.")
+    os.makedirs(FLAGS.output_dir, exist_ok=True)
+    for name in FORMATS:
+        print(write(name, FLAGS.output_dir, FLAGS.rows, FLAGS.seed))
+
+
+if __name__ == "__main__":
+    app.run(main)
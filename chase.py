@@ -1,16 +1,21 @@
 # https://github.com/ArthurFDLR/beancount-chase/blob/master/beancount_chase/__init__.py
 
 from beancount.core.number import D
-from beancount.ingest import importer
 from beancount.core import data, flags
 from beancount.core.amount import Amount
 from beancount.core.number import Decimal
 
-from datetime import datetime
 import csv
 
+import metrics
+import signatures
+from amounts import parse_plain
+from dates import DateParser
+from schema import RowSchema, non_empty
+from streaming import Record, StreamingImporter
 
-class ChaseBankImporter(importer.ImporterProtocol):
+
+class ChaseBankImporter(StreamingImporter):
     """ Beancount Importer for Chase Bank CSV statements.
 
     Attributes:
@@ -19,6 +24,17 @@ class ChaseBankImporter(importer.ImporterProtocol):
         creditCat (str, optional): Income category in beancount format (e.g. 'Income:FIXME'). Defaults to '', no income posting added to the operation.
     """
 
+    schema = RowSchema('Posting Date', 'Description', 'Amount', 'Details', 'Type')
+    signature = signatures.CsvHeader([
+        'Details',
+        'Posting Date',
+        'Description',
+        'Amount',
+        'Type',
+        'Balance',
+        'Check or Slip #',
+    ])
+
     def __init__(
         self,
         account: str,
@@ -47,117 +63,108 @@ class ChaseBankImporter(importer.ImporterProtocol):
 
         date = None
 
-        with open(file_.name, encoding=self.file_encoding) as fd:
-            reader = csv.DictReader(
-                fd, delimiter=',', quoting=csv.QUOTE_MINIMAL, quotechar='"'
-            )
+        rows = non_empty(self._rows(file_))
+        fields = self.schema.compile(next(rows), pad_short_rows=True)
+        parse_date = DateParser('%m/%d/%Y')
 
-            for line in reader:
-                date_tmp = datetime.strptime(
-                    line['Posting Date'], '%m/%d/%Y'
-                ).date()
-                if not date or date_tmp > date:
-                    date = date_tmp
+        for line in rows:
+            date_tmp = parse_date(fields(line)[0])
+            if not date or date_tmp > date:
+                date = date_tmp
 
         return date
 
-    def extract(self, file_, existing_entries=None):
-        entries = []
+    def _rows(self, file_):
+        n = file_ if type(file_) == str else file_.name
+        with open(n, encoding=self.file_encoding) as fd:
+            yield from csv.reader(
+                fd, delimiter=',', quoting=csv.QUOTE_MINIMAL, quotechar='"'
+            )
 
+    def records(self, file_):
         if not self.identify(file_):
-            return []
+            return
 
         n = file_ if type(file_) == str else file_.name
 
-        with open(n, encoding=self.file_encoding) as fd:
-            reader = csv.DictReader(
-                fd, delimiter=',', quoting=csv.QUOTE_MINIMAL, quotechar='"'
+        stats = metrics.file_stats(self, n)
+        rows = non_empty(self._rows(n))
+        fields = self.schema.compile(next(rows), pad_short_rows=True)
+        parse_date = DateParser('%m/%d/%Y')
+
+        for index, line in enumerate(stats.rows(rows)):
+            posting_date, payee, amount_value, details, type_ = fields(line)
+            # Details (DEBIT, CREDIT, CHECK, ...) is Chase's category.
+            yield Record(
+                index,
+                parse_date(posting_date),
+                Amount(parse_plain(amount_value), 'USD'),
+                payee,
+                type_,
+                details,
+                None,
+                None,
             )
 
-            for index, line in enumerate(reader):
-                meta = data.new_metadata(n, index)
-
-                payee = line['Description']
-                currency = 'USD'
-                amount = Decimal(line['Amount'])
-                isExpense = line['Details'] == 'DEBIT'
-
-                postings = [
-                    data.Posting(
-                        self.account,
-                        Amount(amount, currency),
-                        None,
-                        None,
-                        None,
-                        None,
-                    )
-                ]
-
-                if isExpense and len(self.expenseCat) > 0:
-                    postings.append(
-                        data.Posting(
-                            self.expenseCat,
-                            Amount(-amount, currency),
-                            None,
-                            None,
-                            None,
-                            None,
-                        )
-                    )
-                if not isExpense and len(self.creditCat) > 0:
-                    postings.append(
-                        data.Posting(
-                            self.creditCat,
-                            Amount(
-                                (amount if isExpense else -amount), currency
-                            ),
-                            None,
-                            None,
-                            None,
-                            None,
-                        )
-                    )
-
-                entries.append(
-                    data.Transaction(
-                        meta=meta,
-                        date=datetime.strptime(
-                            line['Posting Date'], '%m/%d/%Y'
-                        ).date(),
-                        flag=flags.FLAG_OKAY,
-                        payee=payee,
-                        narration=line['Type'],
-                        tags=data.EMPTY_SET,
-                        links=data.EMPTY_SET,
-                        postings=postings,
-                    )
-                )
-        return entries
-
-    def is_valid_header(self, line: str) -> bool:
-        expected_values = [
-            'Details',
-            'Posting Date',
-            'Description',
-            'Amount',
-            'Type',
-            'Balance',
-            'Check or Slip #',
+    def extract_iter(self, file_, existing_entries=None):
+        # Like records(), this also takes a path.
+        n = file_ if type(file_) == str else file_.name
+        for record in self.records(file_):
+            yield self.build(record, n)
+
+    def build(self, record, filename):
+        meta = data.new_metadata(filename, record.lineno)
+
+        amount = record.amount.number
+        currency = record.amount.currency
+        isExpense = record.category == 'DEBIT'
+
+        postings = [
+            data.Posting(
+                self.account,
+                record.amount,
+                None,
+                None,
+                None,
+                None,
+            )
         ]
-        actual_values = [column.strip('"') for column in line.split(',')]
-        if len(expected_values) != len(actual_values):
-            return False
-        for (expected, actual) in zip(expected_values, actual_values):
-            if expected != actual:
-                return False
-        return True
 
-    def identify(self, file_) -> bool:
-        n = file_ if type(file_) == str else file_.name
+        if isExpense and len(self.expenseCat) > 0:
+            postings.append(
+                data.Posting(
+                    self.expenseCat,
+                    Amount(-amount, currency),
+                    None,
+                    None,
+                    None,
+                    None,
+                )
+            )
+        if not isExpense and len(self.creditCat) > 0:
+            postings.append(
+                data.Posting(
+                    self.creditCat,
+                    Amount(
+                        (amount if isExpense else -amount), currency
+                    ),
+                    None,
+                    None,
+                    None,
+                    None,
+                )
+            )
 
-        with open(n, encoding=self.file_encoding) as fd:
-            try:
-                line = fd.readline().strip()
-            except:
-                return False
-        return self.is_valid_header(line)
+        return data.Transaction(
+            meta=meta,
+            date=record.date,
+            flag=flags.FLAG_OKAY,
+            payee=record.payee,
+            narration=record.narration,
+            tags=data.EMPTY_SET,
+            links=data.EMPTY_SET,
+            postings=postings,
+        )
+
+    def identify(self, file_) -> bool:
+        return signatures.identify(self, file_)
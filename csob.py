@@ -1,13 +1,17 @@
 import csv
-import re
 from datetime import datetime, timedelta
 
 from beancount.core.data import Transaction
 from beancount.core.data import Posting
 from beancount.core import data
 from beancount.core.amount import Amount
-from beancount.ingest import importer
-from beancount.core.number import Decimal
+
+import metrics
+import signatures
+from amounts import amount_parser, intern_currency
+from dates import DateParser
+from schema import RowSchema
+from streaming import Record, StreamingImporter
 
 import pdb
 
@@ -16,22 +20,21 @@ class InvalidFormatError(Exception):
     pass
 
 
-def fmt_number_de(value: str) -> Decimal:
-    thousands_sep = "."
-    decimal_sep = ","
-
-    return Decimal(value.replace(thousands_sep, "").replace(decimal_sep, "."))
+parse_amount = amount_parser("1.234,56", lenient=True)
 
 
-def DecimalOrZero(value):
-    # for string to number conversion with empty strings
-    try:
-        return Decimal(value)
-    except:
-        return Decimal(0.0)
+class CSOBImporter(StreamingImporter):
+    schema = RowSchema(
+        "due date",
+        "amount",
+        "currency",
+        "balance",
+        "note",
+        "counter account name",
+        "counter account",
+    )
+    signature = signatures.CsvHeader(schema.columns, line=2, delimiter=";")
 
-
-class CSOBImporter(importer.ImporterProtocol):
     def __init__(self, account, currency="CZK", file_encoding="UTF-8", manual_fixes=0):
 
         self.account = account
@@ -56,65 +59,67 @@ class CSOBImporter(importer.ImporterProtocol):
         return datetime.now
 
     def identify(self, file_):
-        return "csob" in file_.name
+        return signatures.identify(self, file_)
 
-    def extract(self, file_, existing_entries=None):
-        entries = []
+    def records(self, file_):
+        stats = metrics.file_stats(self, file_)
         with open(file_.name, encoding=self.file_encoding) as fd:
 
             reader = csv.reader(fd, delimiter=self.delimiter)
 
             next(reader)  # skip header line
             next(reader)  # skip header line
-            header = next(reader)  # header
+            fields = self.schema.compile(next(reader))  # header
+            parse_date = DateParser("%d.%m.%Y")
 
             # Data entries
-            for i, row in enumerate(reader):
+            for i, row in enumerate(stats.rows(reader)):
                 if len(row) == 0:  # "end" of bank statment
                     break
 
-                date = datetime.strptime(
-                    row[header.index("due date")], "%d.%m.%Y"
-                ).date()
+                (
+                    due_date,
+                    amount_value,
+                    currency,
+                    balance_value,
+                    description,
+                    payee,
+                    counter_account,
+                ) = fields(row)
+
+                date = parse_date(due_date)
+                currency = intern_currency(currency)
                 amount = Amount(
-                    DecimalOrZero(fmt_number_de(row[header.index("amount")])),
-                    row[header.index("currency")],
+                    parse_amount(amount_value),
+                    currency,
                 )
                 balance = Amount(
-                    DecimalOrZero(fmt_number_de(row[header.index("balance")])),
-                    row[header.index("currency")],
+                    parse_amount(balance_value),
+                    currency,
                 )
-                description = row[header.index("note")]
-                payee = row[header.index("counter account name")]
-                if (
-                    not description
-                    and row[header.index("counter account")] == "1112003761"
-                ):
+                if not description and counter_account == "1112003761":
                     description = "VZP Health Insurance"
 
-                place = ""
-                match = re.search("Place: ([A-Za-z ]+) ", description)
-                if match:
-                    place = match.group(1)
-
-                trans = Transaction(
-                    data.new_metadata(file_.name, i, {"balance": balance}),
-                    date,
-                    self.FLAG,
-                    payee,
-                    description,
-                    data.EMPTY_SET,
-                    data.EMPTY_SET,
-                    [],
-                )
-
-                trans.postings.append(
-                    Posting(self.account, amount, None, None, None, None)
-                )
-                trans.postings.append(
-                    Posting("Expenses:TBD", -amount, None, None, None, None)
-                )
-
-                entries.append(trans)
-
-        return entries
+                yield Record(i, date, amount, payee, description, None, balance, None)
+
+    def build(self, record, filename):
+        meta = data.new_metadata(filename, record.lineno, {"balance": record.balance})
+        amount = record.amount
+
+        trans = Transaction(
+            meta,
+            record.date,
+            self.FLAG,
+            record.payee,
+            record.narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [],
+        )
+        trans.postings.append(
+            Posting(self.account, amount, None, None, None, None)
+        )
+        trans.postings.append(
+            Posting("Expenses:TBD", -amount, None, None, None, None)
+        )
+        return trans
@@ -0,0 +1,130 @@
+import functools
+from datetime import date, datetime
+
+# Every layout the importers here read, in the order ambiguous values are
+# resolved. Day/month order for dashed dates follows dateutil, which reads
+# "01-02-2024" month first unless the day cannot be a month.
+FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d, %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.000Z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%m-%d-%Y",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "%d.%m.%y",
+    "%m/%d/%Y",
+)
+
+_WIDTHS = {"Y": 4, "y": 2, "m": 2, "d": 2, "H": 2, "M": 2, "S": 2}
+
+
+def compile_format(fmt):
+    """Turn a strptime format into a slicing parser returning a date or None.
+
+    Only fixed-width numeric directives are supported, plus a trailing %z.
+    The parser checks the length and the literal characters, slices out the
+    year, month and day and ignores the time of day.
+    """
+    literals = []
+    fields = {}
+    pos = 0
+    has_tz = False
+    i = 0
+    while i < len(fmt):
+        char = fmt[i]
+        if char != "%":
+            literals.append((pos, char))
+            pos += 1
+            i += 1
+            continue
+        directive = fmt[i + 1]
+        i += 2
+        if directive == "z" and i == len(fmt):
+            has_tz = True
+        elif directive in _WIDTHS:
+            fields[directive] = (pos, pos + _WIDTHS[directive])
+            pos += _WIDTHS[directive]
+        else:
+            raise ValueError("Unsupported directive %{} in {!r}".format(directive, fmt))
+    if "m" not in fields or "d" not in fields or not ("Y" in fields or "y" in fields):
+        raise ValueError("Format {!r} has no complete date".format(fmt))
+
+    width = pos
+    year_slice = slice(*fields["Y"]) if "Y" in fields else slice(*fields["y"])
+    short_year = "Y" not in fields
+    month_slice = slice(*fields["m"])
+    day_slice = slice(*fields["d"])
+
+    def parse(value):
+        if has_tz:
+            tz = value[width:]
+            if not (tz == "Z" or (len(tz) in (5, 6) and tz[0] in "+-")):
+                return None
+        elif len(value) != width:
+            return None
+        for at, char in literals:
+            if value[at] != char:
+                return None
+        try:
+            year = int(value[year_slice])
+            if short_year:
+                # Same pivot as strptime's %y.
+                year += 2000 if year < 69 else 1900
+            return date(year, int(value[month_slice]), int(value[day_slice]))
+        except ValueError:
+            return None
+
+    return parse
+
+
+def _strptime(formats, value):
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError("time data {!r} does not match {}".format(value, formats))
+
+
+class DateParser:
+    """Parses the dates of one file with the format they turn out to use.
+
+    The format is picked from `formats` once, either from sample values passed
+    to sniff() or from the first value parsed, and every later value goes
+    through that format's slicing parser. Values it rejects go to `fallback`
+    (strptime over `formats` by default). Results are memoized, since a
+    statement repeats the same few hundred dates many times over.
+    """
+
+    def __init__(self, *formats, fallback=None, cache_size=1024):
+        self.formats = formats or FORMATS
+        self.fallback = fallback or functools.partial(_strptime, self.formats)
+        self._candidates = [compile_format(fmt) for fmt in self.formats]
+        self._fast = None
+        self.parse = functools.lru_cache(maxsize=cache_size)(self._parse)
+
+    def sniff(self, samples):
+        samples = [value for value in samples if value]
+        for fmt, parse in zip(self.formats, self._candidates):
+            if samples and all(parse(value) for value in samples):
+                self._fast = parse
+                return fmt
+        return None
+
+    def _parse(self, value):
+        if self._fast is None:
+            for parse in self._candidates:
+                result = parse(value)
+                if result is not None:
+                    self._fast = parse
+                    return result
+        else:
+            result = self._fast(value)
+            if result is not None:
+                return result
+        return self.fallback(value)
+
+    def __call__(self, value):
+        return self.parse(value)
@@ -0,0 +1,246 @@
+"""Extracts every statement in a downloads directory into one file.
+
+Like bean-extract, this identifies each file with the importers of a
+beancount.ingest config, a Python file defining CONFIG, and extracts it
+with every importer that matches; importers with a header signature are
+matched through signatures.Registry. Files are extracted concurrently in a
+process pool, see parallel.parse_files, and the workers also format the
+entries, so only text goes back to the main process. The output is one
+stream in date order: bean-extract sorts each file's entries, and the
+sorted streams are merged with heapq on the entries' sort keys, never
+sorted all together. Entries an importer flags as already in the ledger
+are written commented out, as bean-extract does, and so are those repeating
+the rows of a file before them, in path order: importers get the ledger
+only, but every entry comes back with the fingerprints of its row (see
+fingerprint.lookup_fields), and the main process checks them against the
+files already extracted.
+
+    python extract.py --config=importers.config --existing=ledger.bean \\
+        --output=new.bean downloads/
+"""
+import collections
+import functools
+import heapq
+import operator
+import os
+import runpy
+import sys
+import textwrap
+import traceback
+
+from absl import app
+from absl import flags
+from beancount import loader
+from beancount.core import data
+from beancount.ingest import cache
+from beancount.ingest import extract as ingest_extract
+from beancount.parser import printer
+
+import fingerprint
+import metrics
+import parallel
+import signatures
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("config", None, "Importer config defining CONFIG, as for bean-extract.")
+flags.DEFINE_string("existing", None, "Ledger whose transactions are flagged as duplicates.")
+flags.DEFINE_string("output", "-", "Where to write the entries; - for stdout.")
+flags.DEFINE_integer("workers", os.cpu_count() or 1, "Files extracted at the same time.")
+flags.DEFINE_string("metrics", None,
+                    "Where to write per-file timings and counts: Prometheus "
+                    "text if it ends in .prom, JSON otherwise.")
+
+
+# Each worker process loads the config and the ledger once, on its first
+# file, rather than getting them pickled with every job.
+@functools.lru_cache(maxsize=None)
+def load_config(path):
+    return runpy.run_path(path)["CONFIG"]
+
+
+@functools.lru_cache(maxsize=None)
+def load_ledger(path):
+    if not path:
+        return None
+    entries, _, _ = loader.load_file(path)
+    return entries
+
+
+def files(paths):
+    """The files in `paths`, walking directories, in a stable order.
+
+    Paths are made absolute, as beancount.ingest.cache requires, and each
+    is yielded once, however many of `paths` lead to it.
+    """
+    seen = set()
+    for path in map(os.path.abspath, paths):
+        if not os.path.isdir(path):
+            found = [path]
+        else:
+            found = []
+            for root, directories, names in os.walk(path):
+                directories.sort()
+                found.extend(os.path.join(root, name) for name in sorted(names))
+        for path in found:
+            if path not in seen:
+                seen.add(path)
+                yield path
+
+
+def identify(importers, paths):
+    """Yields a (path, index in `importers`) job for every match.
+
+    Importers declaring a header signature are found through a
+    signatures.Registry, which reads each file's head once for all of them;
+    only the others have their identify() called.
+    """
+    registry = signatures.Registry(
+        importer for importer in importers if hasattr(importer, "signature")
+    )
+    for path in files(paths):
+        found = {id(importer) for importer in registry.find(path)}
+        file = cache.get_file(path)
+        for index, importer in enumerate(importers):
+            if hasattr(importer, "signature"):
+                matched = id(importer) in found
+            else:
+                matched = importer.identify(file)
+            if matched:
+                yield path, index
+
+
+def format_entry(entry):
+    """The text of `entry`, commented out if it is a duplicate."""
+    if ingest_extract.DUPLICATE_META not in entry.meta:
+        return printer.format_entry(entry)
+    meta = entry.meta.copy()
+    meta.pop(ingest_extract.DUPLICATE_META)
+    return comment_out(printer.format_entry(entry._replace(meta=meta)))
+
+
+def comment_out(text):
+    return textwrap.indent(text, "; ")
+
+
+def row_keys(entry, account):
+    """The fingerprints of `entry`'s row on `account`, most specific first.
+
+    Strings rather than hash(), which differs between processes. Entries
+    the importer found in the ledger have none: they are written commented
+    out already, and later files are checked against the ledger too.
+    """
+    if ingest_extract.DUPLICATE_META in entry.meta:
+        return ()
+    return tuple(
+        "\x1f".join(map(str, fields)) for fields in fingerprint.lookup_fields(entry, account)
+    )
+
+
+def extract_file(config, existing, record_metrics, job):
+    """Returns (entries, FileStats, error) of one job.
+
+    The entries are (sort key, text, row keys) triples, sorted. An importer
+    failing is reported as the formatted traceback, so the other files
+    still get extracted.
+    """
+    path, index = job
+    importer = load_config(config)[index]
+    if record_metrics:
+        metrics.enable()
+    try:
+        file = cache.get_file(path)
+        entries = ingest_extract.extract_from_file(path, importer, load_ledger(existing))
+        account = importer.file_account(file)
+    except Exception:
+        return [], [], traceback.format_exc()
+    with metrics.file_stats(importer, path).phase("format"):
+        entries = [
+            (data.entry_sortkey(entry), format_entry(entry), row_keys(entry, account))
+            for entry in entries
+        ]
+    stats = []
+    if record_metrics:
+        stats = [s for s in metrics.enable().files.values() if s.filename == path]
+    return entries, stats, None
+
+
+class RowIndex:
+    """The row fingerprints of the files extracted so far.
+
+    Like fingerprint.FingerprintIndex, each row matches at most one later
+    row, so identical rows within a file are only flagged as many times as
+    earlier files have them.
+    """
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.used = collections.Counter()
+
+    def mark_duplicates(self, entries):
+        """Returns the (sort key, text) of `entries`, commenting out those
+        whose row an earlier file had, then adds their rows to the index."""
+        marked = []
+        for sortkey, text, keys in entries:
+            for key in keys:
+                if self.used[key] < self.counts[key]:
+                    self.used[key] += 1
+                    text = comment_out(text)
+                    break
+            marked.append((sortkey, text))
+        for _, _, keys in entries:
+            if keys:
+                self.counts[keys[0]] += 1
+        return marked
+
+
+def write(streams, output):
+    """Writes the k-way merge of the sorted `streams` to `output`, laid out
+    like bean-extract's."""
+    output.write(";; -*- mode: beancount -*-\n\n")
+    for _, text in heapq.merge(*streams, key=operator.itemgetter(0)):
+        output.write(text)
+        output.write("\n")
+    output.write("\n")
+
+
+def main(argv):
+    if not FLAGS.config or len(argv) < 2:
+        raise app.UsageError("Pass --config and the files or directories to extract.")
+    if FLAGS.metrics:
+        run = metrics.enable()
+    importers = load_config(FLAGS.config)
+    jobs = list(identify(importers, argv[1:]))
+    extract = functools.partial(extract_file, FLAGS.config, FLAGS.existing, bool(FLAGS.metrics))
+    streams = []
+    rows = RowIndex()
+    failed = 0
+    for (path, index), (entries, stats, error) in parallel.parse_files(
+        jobs, extract, FLAGS.workers
+    ):
+        if error is not None:
+            print(f"{path}: {importers[index].name()} failed:\n{error}", file=sys.stderr)
+            failed += 1
+            continue
+        for file_stats in stats:
+            run.files[(file_stats.importer, file_stats.filename)] = file_stats
+        streams.append(rows.mark_duplicates(entries))
+
+    if FLAGS.output == "-":
+        write(streams, sys.stdout)
+    else:
+        with open(FLAGS.output, "w") as output:
+            write(streams, output)
+    print(
+        "{} statements, {} entries, {} failed".format(
+            len(jobs), sum(len(entries) for entries in streams), failed
+        ),
+        file=sys.stderr,
+    )
+    if FLAGS.metrics:
+        run.write(FLAGS.metrics)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    app.run(main)
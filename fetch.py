@@ -0,0 +1,297 @@
+"""Downloads monthly JSON statements, such as the BCGE API's, into a folder.
+
+Every (account, month) is fetched concurrently over keep-alive connections
+shared between the worker threads. The ETag and Last-Modified of each
+download are kept in a state file and sent back on the next run, so months
+the server reports unchanged are not downloaded again. Files are written
+atomically, and only once they look like the statements the importers
+identify: an expired session's login page never replaces a statement.
+
+    python fetch.py \\
+        --url_template='https://www.bcge.ch/next/api/v3/accounts/{account}/transactions/{year}/{month:02d}' \\
+        --output_template='statements/bcge/{account}/{year}/{month:02d}.json' \\
+        --accounts=1234 --start=2024-01 --header='Cookie: ...' --json_key=data
+"""
+import collections
+import concurrent.futures
+import datetime
+import http.client
+import json
+import os
+import queue
+import threading
+import urllib.parse
+
+from absl import app
+from absl import flags
+
+import atomicfile
+import metrics
+import signatures
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("url_template", None,
+                    "URL of one month, formatted with account, year and month.")
+flags.DEFINE_string("output_template", None,
+                    "Where a month is written, formatted like --url_template.")
+flags.DEFINE_list("accounts", [], "Accounts to fetch.")
+flags.DEFINE_string("start", None, "First month to fetch, YYYY-MM.")
+flags.DEFINE_string("end", None, "Last month to fetch, YYYY-MM. Defaults to this month.")
+flags.DEFINE_multi_string("header", [], "Extra request header, 'Name: value'.")
+flags.DEFINE_string("json_key", None,
+                    "First key a download must have, like 'data' for BCGE or "
+                    "'list' for Viseca. Empty to accept any response.")
+flags.DEFINE_string("state", None,
+                    "File keeping validators between runs. Defaults to "
+                    ".fetch-state.json next to --output_template's folder.")
+flags.DEFINE_integer("workers", 8, "Concurrent downloads.")
+flags.DEFINE_float("timeout", 30, "Seconds before a request is given up.")
+
+# State of another layout is dropped: every URL is fetched unconditionally.
+STATE_FORMAT = 1
+CHUNK_SIZE = 64 * 1024
+
+Job = collections.namedtuple("Job", "url path")
+
+
+class FetchError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, reused across requests and threads.
+
+    A connection is used by one thread at a time: take() hands out an idle
+    connection to the host, or a new one, and give() returns it.
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self._idle = collections.defaultdict(queue.LifoQueue)
+        self._lock = threading.Lock()
+
+    def take(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle[(scheme, netloc)]
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            pass
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def give(self, scheme, netloc, connection):
+        with self._lock:
+            self._idle[(scheme, netloc)].put(connection)
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                while not idle.empty():
+                    idle.get_nowait().close()
+
+    def request(self, url, headers, handle):
+        """Sends a GET for `url` and returns handle(response).
+
+        `handle` must read the response to the end. A reused connection the
+        server has closed in the meantime is replaced and the request sent
+        again, once.
+        """
+        parts = urllib.parse.urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        for attempt in range(2):
+            connection = self.take(parts.scheme, parts.netloc)
+            reused = connection.sock is not None
+            try:
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+                result = handle(response)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.give(parts.scheme, parts.netloc, connection)
+            return result
+
+
+class FetchState:
+    """ETag and Last-Modified of every downloaded URL, kept as JSON in `path`."""
+
+    def __init__(self, path):
+        self.path = path
+        self.validators = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path) as fd:
+                record = json.load(fd)
+        except (OSError, ValueError):
+            record = None
+        if record and record.get("format") == STATE_FORMAT:
+            self.validators = record["urls"]
+
+    def headers(self, job):
+        """The conditional request headers for `job`, if its file still exists."""
+        known = self.validators.get(job.url)
+        if not known or known.get("path") != job.path or not os.path.exists(job.path):
+            return {}
+        headers = {}
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+        return headers
+
+    def update(self, job, response):
+        with self._lock:
+            self.validators[job.url] = {
+                "path": job.path,
+                "etag": response.getheader("ETag"),
+                "last_modified": response.getheader("Last-Modified"),
+            }
+
+    def save(self):
+        with atomicfile.replace(self.path) as out:
+            with self._lock:
+                json.dump({"format": STATE_FORMAT, "urls": self.validators}, out,
+                          indent=1, sort_keys=True)
+
+
+class Fetcher:
+    """Downloads Jobs concurrently, skipping the ones the server says are unchanged.
+
+    `signature`, a signatures.JsonKey or the like, is checked against the
+    start of every download before it replaces the file at its path.
+    """
+
+    def __init__(self, state, headers=None, signature=None, workers=8, timeout=30):
+        self.state = state
+        self.headers = dict(headers or {})
+        self.signature = signature
+        self.workers = workers
+        self.pool = ConnectionPool(timeout)
+
+    def fetch(self, jobs):
+        """Returns (job, outcome) in the order of `jobs`.
+
+        The outcome is "fetched", "unchanged", "missing" for a 404, or the
+        exception the download failed with. The state is saved either way.
+        """
+        jobs = list(jobs)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                outcomes = list(executor.map(self._fetch_one, jobs))
+        finally:
+            self.pool.close()
+            self.state.save()
+        return list(zip(jobs, outcomes))
+
+    def _fetch_one(self, job):
+        stats = metrics.file_stats("fetch", job.path)
+        headers = dict(self.headers)
+        headers.update(self.state.headers(job))
+        try:
+            with stats.phase("fetch"):
+                outcome = self.pool.request(
+                    job.url, headers, lambda response: self._handle(job, response))
+        except (OSError, http.client.HTTPException, FetchError) as e:
+            stats.count("errors")
+            return e
+        stats.count(outcome)
+        return outcome
+
+    def _handle(self, job, response):
+        if response.status == 304:
+            response.read()
+            return "unchanged"
+        if response.status == 404:
+            response.read()
+            return "missing"
+        if response.status != 200:
+            response.read()
+            raise FetchError("{}: HTTP {} {}".format(job.url, response.status, response.reason))
+        self._write(job, response)
+        self.state.update(job, response)
+        return "fetched"
+
+    def _write(self, job, response):
+        with atomicfile.replace(job.path, "wb", suffix=".part") as out:
+            head = b""
+            size = 0
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < signatures.HEAD_BYTES:
+                    head += chunk[:signatures.HEAD_BYTES - len(head)]
+                size += len(chunk)
+                out.write(chunk)
+            if self.signature is not None:
+                header = signatures.Head(head, size).header(self.signature.key)
+                if not self.signature.matches(header):
+                    raise FetchError("{}: response is not a statement".format(job.url))
+
+
+def months(start, end):
+    """The (year, month) pairs from `start` to `end`, both "YYYY-MM", inclusive."""
+    year, month = map(int, start.split("-"))
+    last = tuple(map(int, end.split("-")))
+    while (year, month) <= last:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def monthly_jobs(url_template, output_template, accounts, start, end):
+    return [
+        Job(
+            url_template.format(account=account, year=year, month=month),
+            output_template.format(account=account, year=year, month=month),
+        )
+        for account in accounts
+        for year, month in months(start, end)
+    ]
+
+
+def main(argv):
+    del argv
+    if not (FLAGS.url_template and FLAGS.output_template and FLAGS.accounts and FLAGS.start):
+        raise app.UsageError(
+            "Pass --url_template, --output_template, --accounts and --start.")
+    end = FLAGS.end or datetime.date.today().strftime("%Y-%m")
+    headers = {}
+    for header in FLAGS.header:
+        name, _, value = header.partition(":")
+        headers[name.strip()] = value.strip()
+    state_path = FLAGS.state or os.path.join(
+        os.path.dirname(FLAGS.output_template.split("{", 1)[0]) or ".", ".fetch-state.json")
+    fetcher = Fetcher(
+        FetchState(state_path),
+        headers,
+        signatures.JsonKey(FLAGS.json_key) if FLAGS.json_key else None,
+        FLAGS.workers,
+        FLAGS.timeout,
+    )
+    jobs = monthly_jobs(FLAGS.url_template, FLAGS.output_template, FLAGS.accounts,
+                        FLAGS.start, end)
+    counts = collections.Counter()
+    for job, outcome in fetcher.fetch(jobs):
+        if isinstance(outcome, Exception):
+            print(f"{job.path}: {outcome}")
+            outcome = "failed"
+        counts[outcome] += 1
+    print(", ".join(f"{count} {outcome}" for outcome, count in sorted(counts.items())))
+    if counts["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,34 @@
+import collections
+import hashlib
+import os
+
+# Heads kept at most; the least recently used one is dropped first.
+MAX_FILES = 1024
+
+_heads = collections.OrderedDict()
+
+
+def head(file, nbytes, parse):
+    """Returns parse(raw, size) for the first `nbytes` of `file`, a path or
+    a beancount FileMemo, and its size.
+
+    identify() of every importer is called on each file of a bean-extract/
+    bean-file run. Only the first bytes are read, every time, and what
+    `parse` makes of them is kept per content hash of those bytes and the
+    size, so a rewritten file is never mistaken for the old one. At most
+    MAX_FILES results are kept. Statements themselves are not cached:
+    records() streams them from disk.
+    """
+    path = file if isinstance(file, str) else file.name
+    with open(path, "rb") as fd:
+        raw = fd.read(nbytes)
+        size = os.fstat(fd.fileno()).st_size
+    key = (parse, hashlib.sha256(raw + str(size).encode()).hexdigest())
+    parsed = _heads.get(key)
+    if parsed is None:
+        parsed = _heads[key] = parse(raw, size)
+        if len(_heads) > MAX_FILES:
+            _heads.popitem(last=False)
+    else:
+        _heads.move_to_end(key)
+    return parsed
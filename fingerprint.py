@@ -0,0 +1,130 @@
+import collections
+
+from beancount.core import data
+from beancount.ingest.extract import DUPLICATE_META
+
+
+def normalize_description(text):
+    return " ".join((text or "").casefold().split())
+
+
+def _hash(account, date, units, description, balance):
+    """Hashes the fields that identify a statement row, see lookup_fields().
+
+    Only the hash is kept, so an index over a large ledger stays small; a
+    collision can at worst flag a row as duplicate, it never drops it.
+    """
+    if balance is None:
+        return hash((account, date, units.number, units.currency, description))
+    return hash(
+        (
+            account,
+            date,
+            units.number,
+            units.currency,
+            description,
+            balance.number,
+            balance.currency,
+        )
+    )
+
+
+def _description(entry):
+    return entry.narration or entry.payee
+
+
+def _balance(entry):
+    balance = entry.meta.get("balance") if entry.meta else None
+    return balance if isinstance(balance, data.Amount) else None
+
+
+class FingerprintIndex:
+    """How many postings of existing transactions have each fingerprint.
+
+    Every posting with units is indexed, with the entry's balance metadata
+    if it has any, so an imported row matches whichever account it books.
+    """
+
+    def __init__(self, entries):
+        self.counts = collections.Counter()
+        for entry in entries:
+            if not isinstance(entry, data.Transaction):
+                continue
+            description = normalize_description(_description(entry))
+            balance = _balance(entry)
+            for posting in entry.postings:
+                units = posting.units
+                if units is None or units.number is None:
+                    continue
+                key = _hash(posting.account, entry.date, units, description, balance)
+                self.counts[key] += 1
+
+    def __len__(self):
+        return len(self.counts)
+
+    def mark_duplicates(self, entries, account):
+        """Yields `entries`, flagging those already in the index.
+
+        Only the posting on the importer's own `account` is looked up, as
+        the other side may have been recategorized in the ledger: first with
+        the row's balance, then without in case the ledger dropped it. Each
+        indexed posting matches at most one row of `entries`, so repeated
+        identical rows are only flagged as many times as the ledger has them.
+        """
+        used = collections.Counter()
+        for entry in entries:
+            for key in map(hash, lookup_fields(entry, account)):
+                if used[key] < self.counts[key]:
+                    used[key] += 1
+                    entry.meta[DUPLICATE_META] = True
+                    break
+            yield entry
+
+
+def lookup_fields(entry, account):
+    """The fields a row is looked up by, as they are hashed.
+
+    With its balance first, if it has one, then without; empty if `entry`
+    is not a Transaction with a posting on `account`.
+    """
+    posting = _own_posting(entry, account)
+    if posting is None:
+        return []
+    units = posting.units
+    description = normalize_description(_description(entry))
+    fields = (posting.account, entry.date, units.number, units.currency, description)
+    balance = _balance(entry)
+    if balance is None:
+        return [fields]
+    return [fields + (balance.number, balance.currency), fields]
+
+
+def _own_posting(entry, account):
+    if isinstance(entry, data.Transaction):
+        for posting in entry.postings:
+            if posting.account == account and posting.units is not None:
+                return posting
+    return None
+
+
+_cached_index = (None, None)
+
+
+def index_for(existing_entries):
+    """Returns the FingerprintIndex of `existing_entries`.
+
+    bean-extract passes the same ledger list to every importer of a run, so
+    the index is built once for it and shared by all of them.
+    """
+    global _cached_index
+    entries, index = _cached_index
+    if entries is not existing_entries:
+        index = FingerprintIndex(existing_entries)
+        _cached_index = (existing_entries, index)
+    return index
+
+
+def mark_duplicates(entries, existing_entries, account):
+    if not existing_entries:
+        return iter(entries)
+    return index_for(existing_entries).mark_duplicates(entries, account)
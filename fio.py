@@ -6,32 +6,33 @@ from beancount.core.data import Transaction
 from beancount.core.data import Posting
 from beancount.core import data
 from beancount.core.amount import Amount
-from beancount.ingest import importer
 from beancount.core.number import Decimal
 
+import metrics
+import signatures
+from amounts import amount_parser
+from dates import DateParser
+from schema import RowSchema
+from streaming import Record, StreamingImporter
+
 
 class InvalidFormatError(Exception):
     pass
 
 
-def fmt_number_de(value: str) -> Decimal:
-    thousands_sep = "."
-    decimal_sep = ","
-
-    return Decimal(value.replace(thousands_sep, "").replace(decimal_sep, "."))
+parse_amount = amount_parser("-1234,50", lenient=True)
 
 
-def DecimalOrZero(value):
-    # for string to number conversion with empty strings
-    try:
-        return Decimal(value.replace(",", "."))
-    except:
-        return Decimal(0.0)
+class FioImporter(StreamingImporter):
+    schema = RowSchema("Datum", "Objem", "Název protiúčtu", "Poznámka", "Provedl")
 
-
-class FioImporter(importer.ImporterProtocol):
     def __init__(
-        self, account, currency="CZK", file_encoding="utf-8-sig", manual_fixes=0
+        self,
+        account,
+        currency="CZK",
+        file_encoding="utf-8-sig",
+        manual_fixes=0,
+        account_id="2000466790",
     ):
 
         self.account = account
@@ -47,6 +48,12 @@ class FioImporter(importer.ImporterProtocol):
         self.manual_fixes = manual_fixes
 
         self.tags = {}
+        # Exports of other Fio accounts have the same columns; the preamble's
+        # "accountId" line tells them apart.
+        self.signature = signatures.AllOf(
+            signatures.CsvHeader(["accountId", account_id], line=0, delimiter=";"),
+            signatures.CsvHeader(self.schema.columns, line=9, delimiter=";"),
+        )
 
     def name(self):
         return "Fio {}".format(self.__class__.__name__)
@@ -58,10 +65,10 @@ class FioImporter(importer.ImporterProtocol):
         return datetime.now
 
     def identify(self, file):
-        return "Vypis_z_uctu-2000466790" in file.name
+        return signatures.identify(self, file)
 
-    def extract(self, file_, existing_entries=None):
-        entries = []
+    def records(self, file_):
+        stats = metrics.file_stats(self, file_)
         with open(file_.name, encoding=self.file_encoding) as fd:
             reader = csv.reader(fd, delimiter=self.delimiter)
 
@@ -91,23 +98,17 @@ class FioImporter(importer.ImporterProtocol):
             #
             header = next(reader)  # skip header line
             # print(header)
-            amount_index = header.index("Objem")
-            date_index = header.index("Datum")
-            payee_index = header.index("Název protiúčtu")
-            description_index = header.index("Poznámka")
-            provedl_index = header.index("Provedl")
+            fields = self.schema.compile(header)
+            parse_date = DateParser("%d.%m.%Y")
 
             # Data entries
-            for i, row in enumerate(reader):
+            for i, row in enumerate(stats.rows(reader)):
                 if len(row) == 0:  # "end" of bank statement
                     break
 
-                meta = data.new_metadata(file_.name, i)
-                date = datetime.strptime(row[date_index], "%d.%m.%Y").date()
-                amount = Amount(DecimalOrZero(row[amount_index]), self.currency)
-                payee = row[payee_index]
-                description = row[description_index]
-                provedl = row[provedl_index]
+                date_value, amount_value, payee, description, provedl = fields(row)
+
+                amount = Amount(parse_amount(amount_value), self.currency)
 
                 if not description:
                     description = payee
@@ -120,26 +121,10 @@ class FioImporter(importer.ImporterProtocol):
                         description.replace("Nákup: ", "").split(",", 1)[0].strip()
                     )
 
-                trans = Transaction(
-                    meta,
-                    date,
-                    self.FLAG,
-                    "",
-                    description,
-                    data.EMPTY_SET,
-                    data.EMPTY_SET,
-                    [],
+                yield Record(
+                    i, parse_date(date_value), amount, "", description, None, None, None
                 )
 
-                trans.postings.append(
-                    Posting(self.account, amount, None, None, None, None)
-                )
-                trans.postings.append(
-                    Posting("Expenses:TBD", -amount, None, None, None, None)
-                )
-
-                entries.append(trans)
-
             meta = data.new_metadata(file_.name, 0)
             # entries.append(
             #     Balance(
@@ -152,4 +137,25 @@ class FioImporter(importer.ImporterProtocol):
             #     )
             # )
 
-        return entries
+    def build(self, record, filename):
+        meta = data.new_metadata(filename, record.lineno)
+        amount = record.amount
+
+        trans = Transaction(
+            meta,
+            record.date,
+            self.FLAG,
+            record.payee,
+            record.narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [],
+        )
+
+        trans.postings.append(
+            Posting(self.account, amount, None, None, None, None)
+        )
+        trans.postings.append(
+            Posting("Expenses:TBD", -amount, None, None, None, None)
+        )
+        return trans
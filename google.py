@@ -1,11 +1,12 @@
 import datetime
 import glob
-import locale
-import re
+import json
+import os
 from typing import List
 
 from absl import app
 from absl import flags
+from absl import logging
 from beancount.core import data
 from beancount.core.amount import Amount
 from beancount.core.number import Decimal
@@ -13,6 +14,13 @@ from beancount.parser import printer
 from pdfreader import SimplePDFViewer
 from pdfreader.viewer import PageDoesNotExist
 
+import atomicfile
+import metrics
+import parallel
+from amounts import amount_parser
+from dates import DateParser
+from parsecache import file_hash
+
 BRUTTO_INCOME_ACCOUNT = "Income:Salary:Google:CH:Brutto"
 NETTO_INCOME_ACCOUNT = "Income:Salary:Google:CH:Netto"
 SALARY_TYPES = {
@@ -44,14 +52,34 @@ COLUNM_TO_ACCOUNT = {
     "G Give charitable donation": "Expenses:Donation",
     "TOTAL": NETTO_INCOME_ACCOUNT,
 }
+# Version of the manifest written next to the output; --incremental starts
+# over when it does not match.
+MANIFEST_FORMAT = 1
+
 FLAGS = flags.FLAGS
 flags.DEFINE_string("output", "ledger/google.bean",
                     "Output bean file. Will be overwritten.")
+flags.DEFINE_string("page_cache", "payslips/Google/.pages",
+                    "Directory keeping the text of already rendered pages. "
+                    "Empty to render every PDF again.")
+flags.DEFINE_integer("workers", os.cpu_count() or 1,
+                     "Number of processes rendering PDFs.")
+flags.DEFINE_bool("incremental", False,
+                  "Only parse payslips missing from the output's manifest and "
+                  "append their transactions, if they all come after the ones "
+                  "already written. Otherwise the output is rewritten.")
+flags.DEFINE_string("metrics", None,
+                    "Where to write per-payslip timings and page counts: "
+                    "Prometheus text if it ends in .prom, JSON otherwise. "
+                    "Rendering is only timed with --workers=1.")
+
+
+parse_chf = amount_parser("1'234.56")
+parse_date = DateParser("%d.%m.%Y")
 
 
 def pares_amount(s: str) -> Amount:
-    s = re.sub(r"[\s']", "", s)
-    return Amount(locale.atof(s, Decimal), "CHF")
+    return Amount(parse_chf("".join(s.split())), "CHF")
 
 
 def get_amount_for(strings: List[str], idx: int) -> Amount:
@@ -61,9 +89,10 @@ def get_amount_for(strings: List[str], idx: int) -> Amount:
             # absolute number.
             return pares_amount(strings[idx + 2])
         return pares_amount(strings[idx + 1])
-    except Exception:
-        print(strings[idx - 1:idx + 3])
-    raise
+    except (IndexError, ValueError) as e:
+        raise ValueError(
+            "No amount for {!r} in {}".format(strings[idx], strings[idx - 1:idx + 3])
+        ) from e
 
 def make_posting(account: str, amount: Amount, meta=None) -> data.Posting:
     return data.Posting(
@@ -75,42 +104,85 @@ def make_posting(account: str, amount: Amount, meta=None) -> data.Posting:
         meta=meta)
 
 
-def page_to_transaction(fn: str, v: SimplePDFViewer) -> data.Transaction:
-    print(f"Parsing file {fn} page {v.current_page_number}.")
-    v.render()
+def render_pages(fn: str) -> List[List[str]]:
+    """Returns the canvas strings of every page of a PDF."""
+    pages = []
+    stats = metrics.file_stats("google", fn)
+    with stats.phase("render"), open(fn, "rb") as fd:
+        v = SimplePDFViewer(fd)
+        while True:
+            stats.count("pages_rendered")
+            v.render()
+            pages.append(list(v.canvas.strings))
+            try:
+                v.next()    # pylint: disable=not-callable
+            except PageDoesNotExist:
+                break
+    return pages
+
+
+class PageTextCache:
+    """Rendered page strings, stored as one JSON file per PDF content hash.
+
+    Follows the lookup()/store() protocol of parsecache.ParsedFileCache, so
+    it can be passed to parallel.parse_files(). Keyed by content only: a
+    payslip that is moved or renamed is not rendered again.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _cache_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash + ".json")
+
+    def lookup(self, fn: str):
+        content_hash = file_hash(fn)
+        try:
+            with open(self._cache_path(content_hash)) as f:
+                return json.load(f), None
+        except (OSError, ValueError):
+            return None, content_hash
+
+    def store(self, fn: str, content_hash: str, pages: List[List[str]]):
+        with atomicfile.replace(self._cache_path(content_hash)) as f:
+            json.dump(pages, f)
+
+
+def page_to_transaction(fn: str, page_number: int,
+                        strings: List[str]) -> data.Transaction:
     date = None
     period = None
     postings = []
-    for i, text in enumerate(v.canvas.strings):
-    if text == "Period":
-        period = v.canvas.strings[i + 1]
-        continue
-    if text == "Date of payment":
-        date = datetime.datetime.strptime(v.canvas.strings[i + 2],
-                                          "%d.%m.%Y").date()
-        continue
-    meta = data.new_metadata(fn, i, {"salary_element": text})
-    if text in SALARY_TYPES:
-        amount = get_amount_for(v.canvas.strings, i)
-        postings += [make_posting(BRUTTO_INCOME_ACCOUNT, -amount, meta)]
-        continue
-    if text == "Tax/soc. sec. paid by employer":
-        amount = get_amount_for(v.canvas.strings, i - 2)
-        postings += [make_posting(BRUTTO_INCOME_ACCOUNT, -amount, meta)]
-        continue
-    if text.startswith("Overtime/Special Pay - "):
-        amount = pares_amount(v.canvas.strings[i + 2])
-        postings += [make_posting(BRUTTO_INCOME_ACCOUNT, -amount, meta)]
-        continue
-    if text in COLUNM_TO_ACCOUNT:
-        amount = get_amount_for(v.canvas.strings, i)
-        postings += [make_posting(COLUNM_TO_ACCOUNT[text], amount, meta)]
-        continue
+    for i, text in enumerate(strings):
+        if text == "Period":
+            period = strings[i + 1]
+            continue
+        if text == "Date of payment":
+            date = parse_date(strings[i + 2])
+            continue
+        meta = data.new_metadata(fn, i, {"salary_element": text})
+        if text in SALARY_TYPES:
+            amount = get_amount_for(strings, i)
+            postings += [make_posting(BRUTTO_INCOME_ACCOUNT, -amount, meta)]
+            continue
+        if text == "Tax/soc. sec. paid by employer":
+            amount = get_amount_for(strings, i - 2)
+            postings += [make_posting(BRUTTO_INCOME_ACCOUNT, -amount, meta)]
+            continue
+        if text.startswith("Overtime/Special Pay - "):
+            amount = pares_amount(strings[i + 2])
+            postings += [make_posting(BRUTTO_INCOME_ACCOUNT, -amount, meta)]
+            continue
+        if text in COLUNM_TO_ACCOUNT:
+            amount = get_amount_for(strings, i)
+            postings += [make_posting(COLUNM_TO_ACCOUNT[text], amount, meta)]
+            continue
     assert date, date
     assert period, period
-    assert postings, v.canvas.strings
+    assert postings, strings
     return data.Transaction(
-        meta=data.new_metadata(fn, v.current_page_number),
+        meta=data.new_metadata(fn, page_number),
         date=date,
         flag="*",
         payee="",
@@ -120,25 +192,95 @@ def page_to_transaction(fn: str, v: SimplePDFViewer) -> data.Transaction:
         postings=postings)
 
 
+def file_stamp(fn: str, known=None) -> dict:
+    """Size, mtime and content hash of a file; reuses `known` if unchanged."""
+    stat = os.stat(fn)
+    if (known and known["size"] == stat.st_size
+            and known["mtime_ns"] == stat.st_mtime_ns):
+        return known
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": file_hash(fn),
+    }
+
+
+def load_manifest(path: str) -> dict:
+    """Returns the manifest written with the output, or None."""
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != MANIFEST_FORMAT:
+        return None
+    return manifest
+
+
+def write_manifest(path: str, manifest: dict):
+    with atomicfile.replace(path) as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def parse_payslips(files: List[str]) -> List[data.Transaction]:
+    cache = PageTextCache(FLAGS.page_cache) if FLAGS.page_cache else None
+    entries = []
+    for fn, pages in parallel.parse_files(files, render_pages, FLAGS.workers,
+                                          cache):
+        stats = metrics.file_stats("google", fn)
+        with stats.phase("build"):
+            for page_number, strings in enumerate(pages, 1):
+                entries.append(page_to_transaction(fn, page_number, strings))
+        stats.count("entries", len(pages))
+    return sorted(entries, key=data.entry_sortkey)
+
+
 def main(argv):
     del argv
-    files = glob.glob("payslips/Google/20*/*.pdf")
-    entries = []
-    for fn in sorted(files):
-    v = SimplePDFViewer(open(fn, "rb"))
-    while True:
-        entries.append(page_to_transaction(fn, v))
-        try:
-        v.next()    # pylint: disable=not-callable
-        except PageDoesNotExist:
-        break
+    if FLAGS.metrics:
+        metrics.enable()
+    files = sorted(glob.glob("payslips/Google/20*/*.pdf"))
+    manifest_path = FLAGS.output + ".manifest.json"
+    manifest = None
+    if FLAGS.incremental and os.path.exists(FLAGS.output):
+        manifest = load_manifest(manifest_path)
+
+    known = manifest["files"] if manifest else {}
+    stamps = {fn: file_stamp(fn, known.get(fn)) for fn in files}
+    # Appending is only safe if every payslip written before is still there,
+    # unchanged.
+    append = manifest is not None and all(
+        fn in stamps and stamps[fn]["hash"] == stamp["hash"]
+        for fn, stamp in known.items())
+    entries = parse_payslips(
+        [fn for fn in files if fn not in known] if append else files)
+    if append and entries and entries[0].date < datetime.date.fromisoformat(
+            manifest["last_date"]):
+        logging.warning("%s predates %s, rewriting it.",
+                        entries[0].meta["filename"], FLAGS.output)
+        append = False
+        entries = parse_payslips(files)
 
-    entries = sorted(entries, key=data.entry_sortkey)
     if len(entries) < 10:
-    printer.print_entries(entries)
-    with open(FLAGS.output, "w") as f:
-    f.write('plugin "beancount.plugins.auto_accounts"\n')
-    printer.print_entries(entries, file=f)
+        printer.print_entries(entries)
+    if append:
+        with open(FLAGS.output, "a") as f:
+            printer.print_entries(entries, file=f)
+    else:
+        with open(FLAGS.output, "w") as f:
+            f.write('plugin "beancount.plugins.auto_accounts"\n')
+            printer.print_entries(entries, file=f)
+
+    last_date = entries[-1].date.isoformat() if entries else None
+    if append and manifest["last_date"]:
+        last_date = max(last_date or "", manifest["last_date"])
+    write_manifest(manifest_path, {
+        "format": MANIFEST_FORMAT,
+        "last_date": last_date,
+        "files": stamps,
+    })
+    if FLAGS.metrics:
+        metrics.enable().write(FLAGS.metrics)
 
 
 if __name__ == "__main__":
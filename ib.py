@@ -1,6 +1,7 @@
 import csv
 import datetime
 import decimal
+import functools
 import json
 import os
 import re
@@ -20,154 +21,204 @@ from beancount_import.matching import FIXME_ACCOUNT
 from beancount_import.source import ImportResult, Source, InvalidSourceReference, SourceResults, AssociatedData, LogFunction, description_based_source
 from beancount_import.journal_editor import JournalEditor
 
+import amounts
+import dates
+import journalindex
+import metrics
+from amounts import intern_currency, parse_english
+from dates import DateParser
+import parallel
+from parsecache import ParsedFileCache, source_version
+
+parse_date = DateParser('%Y-%m-%d')
+parse_datetime = DateParser('%Y-%m-%d, %H:%M:%S')
+
+
+def _not_total(line_dict):
+    return 'total' not in line_dict['Currency'].lower()
+
+
+def _not_fee_total(line_dict):
+    return not line_dict['Subtitle'].startswith('Total') and not line_dict['Header'].startswith('Notes')
+
+
+# Sections that move cash between the account and one counter account:
+# section -> (date column, counter account, which rows to keep).
+CASH_SECTIONS = {
+    'Deposits & Withdrawals': ('Settle Date', 'Expenses:FIXME', lambda line_dict: len(line_dict['Currency']) == 3),
+    'Fees': ('Date', 'Expenses:Fees:Brokerage', _not_fee_total),
+    'Dividends': ('Date', 'Income:Dividends', _not_total),
+    'Withholding Tax': ('Date', 'Expenses:Tax:Withholding', _not_total),
+    'Interest': ('Date', 'Expenses:Fees:BrokerageInterest', _not_total),
+}
+
 def hexmd5(input):
-    thing = hashlib.md5()
-    thing.update(','.join(input).encode('utf-8'))
-    return thing.hexdigest()
+    thing = hashlib.md5()
+    thing.update(','.join(input).encode('utf-8'))
+    return thing.hexdigest()
 
 class IBSource(description_based_source.DescriptionBasedSource):
-    def __init__(self, directory: str, account: str, **kwargs):
-        super(IBSource, self).__init__(**kwargs)
-        self.directory = directory
-        self.account = account
-
-    @property
-    def name(self) -> str:
-        return "IB CSV importer"
-    
-    def prepare(self, journal: JournalEditor, results: SourceResults):
-        results.add_account(self.account)
-        seen_txns = set()
-        skipped_entries = 0
-        for entry in journal.all_entries:
-            if not isinstance(entry, Transaction) or not entry.meta.get('txn_id_ib'): 
-                skipped_entries += 1
-                continue
-            seen_txns.add(entry.meta.get('txn_id_ib'))
-        print("{} entries in seen set, {} skipped".format(len(seen_txns), skipped_entries))
-        
-        new_entries = []
-        for filename in os.listdir(self.directory):
-            new_entries.extend(self.handle_file(os.path.join(self.directory, filename)))
-        
-        for entry in new_entries:
-            if not isinstance(entry, Transaction): continue
-            if not entry.meta.get('txn_id_ib') in seen_txns:
-                results.add_pending_entry(ImportResult(date=entry.date, entries=[entry], info={'type': 'application/csv', 'filename':'ibfile'}))
-    
-    def handle_file(self, file_path):
-        with open(file_path, 'r') as infile:
-            lines = list(csv.reader(infile))
-        entries = []
-        cur_section = None
-        cur_header = None
-        portfolio = {}
-        for index, line in enumerate(lines):
-            split_line = line
-            if split_line[1] == 'Header':
-                cur_section = split_line[0]
-                cur_header = split_line[1:]
-                continue
-            line_dict = dict(zip(cur_header, split_line[1:]))
-
-            meta = data.new_metadata(file_path, index)
-            meta['txn_id_ib'] = hexmd5(line)
-            if cur_section == 'Deposits & Withdrawals' and len(line_dict['Currency']) == 3:
-                date = datetime.datetime.strptime(line_dict['Settle Date'], '%Y-%m-%d').date()
-                desc = line_dict['Description']
-                units = amount.Amount(D(line_dict['Amount']), line_dict['Currency'])
-                entries.append(data.Transaction(
-                    meta, date, '*', None, desc, data.EMPTY_SET, set(), [
-                        data.Posting(self.account, units, None, None, None, None),
-                        data.Posting('Expenses:FIXME', -units, None, None, None, None),
-                    ]))
-            if cur_section == 'Fees' and not line_dict['Subtitle'].startswith('Total') and not line_dict['Header'].startswith('Notes'):
-                date = datetime.datetime.strptime(line_dict['Date'], '%Y-%m-%d').date()
-                desc = line_dict['Description']
-                units = amount.Amount(D(line_dict['Amount']), line_dict['Currency'])
-                entries.append(data.Transaction(
-                    meta, date, '*', None, desc, data.EMPTY_SET, set(), [
-                        data.Posting(self.account, units, None, None, None, None),
-                        data.Posting('Expenses:Fees:Brokerage', -units, None, None, None, None),
-                    ]))
-            if cur_section == 'Dividends' and 'total' not in line_dict['Currency'].lower():
-                date = datetime.datetime.strptime(line_dict['Date'], '%Y-%m-%d').date()
-                desc = line_dict['Description']
-                units = amount.Amount(D(line_dict['Amount']), line_dict['Currency'])
-                entries.append(data.Transaction(
-                    meta, date, '*', None, desc, data.EMPTY_SET, set(), [
-                        data.Posting(self.account, units, None, None, None, None),
-                        data.Posting('Income:Dividends', -units, None, None, None, None),
-                    ]))
-            if cur_section == 'Withholding Tax' and 'total' not in line_dict['Currency'].lower():
-                date = datetime.datetime.strptime(line_dict['Date'], '%Y-%m-%d').date()
-                desc = line_dict['Description']
-                units = amount.Amount(D(line_dict['Amount']), line_dict['Currency'])
-                entries.append(data.Transaction(
-                    meta, date, '*', None, desc, data.EMPTY_SET, set(), [
-                        data.Posting(self.account, units, None, None, None, None),
-                        data.Posting('Expenses:Tax:Withholding', -units, None, None, None, None),
-                    ]))
-            if cur_section == 'Interest' and 'total' not in line_dict['Currency'].lower():
-                date = datetime.datetime.strptime(line_dict['Date'], '%Y-%m-%d').date()
-                desc = line_dict['Description']
-                units = amount.Amount(D(line_dict['Amount']), line_dict['Currency'])
-                entries.append(data.Transaction(
-                    meta, date, '*', None, desc, data.EMPTY_SET, set(), [
-                        data.Posting(self.account, units, None, None, None, None),
-                        data.Posting('Expenses:Fees:BrokerageInterest', -units, None, None, None, None),
-                    ]))
-            if cur_section == 'Trades' and line_dict['DataDiscriminator'] == 'Order' and line_dict['Asset Category'].startswith('Forex'):
-                symbol = line_dict['Symbol']
-                cur1, cur2 = line_dict['Symbol'].split('.')
-                quantity = D(line_dict['Quantity'].replace(',', ''))
-                trade_price = D(line_dict['T. Price'])
-                fees = amount.Amount(abs(D(line_dict['Comm in EUR'])), 'EUR')
-                increment_cur1 = amount.Amount(quantity, cur1)
-                increment_cur2 = amount.Amount(D(line_dict['Proceeds']), cur2)
-                date = datetime.datetime.strptime(line_dict['Date/Time'], '%Y-%m-%d, %H:%M:%S').date()
-                desc = '{} - {} @ {}'.format(quantity, symbol, line_dict['T. Price'])
-
-                postings = [
-                    data.Posting(self.account, increment_cur1, None, amount.Amount(trade_price, cur2), None, None),
-                    data.Posting(self.account, increment_cur2, None, None, None, None),
-                    data.Posting('Expenses:Fees:Brokerage', fees, None, None, None, None),
-                    data.Posting(self.account, -fees, None, None, None, None),
-                ]
-                entries.append(data.Transaction(
-                    meta, date, '*', None, desc, data.EMPTY_SET, set(), postings))
-
-            if cur_section == 'Trades' and line_dict['DataDiscriminator'] == 'Order' and (line_dict['Asset Category'].startswith('Stocks') or line_dict['Asset Category'].startswith('Equity and Index Options')):
-                is_options = 'Options' in line_dict['Asset Category']
-                symbol = line_dict['Symbol'].replace(' ', '_')
-                quantity = D(line_dict['Quantity'].replace(',', ''))
-                trade_price = D(line_dict['T. Price'])
-                if is_options:
-                    trade_price *= 100
-                currency = line_dict['Currency']
-                rate = position.Cost(trade_price, currency, None, None)
-                fees = amount.Amount(abs(D(line_dict['Comm/Fee'])), line_dict['Currency'])
-                date = datetime.datetime.strptime(line_dict['Date/Time'], '%Y-%m-%d, %H:%M:%S').date()
-                desc = '{} - {} @ {}'.format(quantity, symbol, line_dict['T. Price'])
-                cash_amount = amount.Amount(D(line_dict['Proceeds']) + D(line_dict['Comm/Fee']), currency)
-                if quantity > 0:
-                    basis = None
-                else:
-                    basis = rate
-                if symbol not in portfolio:
-                    portfolio[symbol] = 0
-                postings = [
-                    data.Posting(self.account, cash_amount, None, None, None, None),
-                    data.Posting('Expenses:Fees:Brokerage', fees, None, None, None, None),
-                    data.Posting('Assets:Stock', amount.Amount(D(quantity), symbol), basis, amount.Amount(trade_price, currency), None, None),
-                ]
-                if trade_price == 0 or (abs(portfolio[symbol]) + quantity < abs(portfolio[symbol])):
-                    postings.append(data.Posting('Income:TradingProfit', None, None, None, None, None))
-                entries.append(data.Transaction(
-                    meta, date, '*', None, desc, data.EMPTY_SET, set(), postings))
-                portfolio[symbol] += quantity
-
-        return entries
+    def __init__(self, directory: str, account: str, cache_dir: str = None, workers: int = 1, index_path: str = None, **kwargs):
+        super(IBSource, self).__init__(**kwargs)
+        self.directory = directory
+        self.account = account
+        self.workers = workers
+        self.index_path = index_path
+        self.cache = None
+        if cache_dir:
+            self.cache = ParsedFileCache(cache_dir, source_version(
+                __file__, amounts.__file__, dates.__file__, params=(account,)))
+
+    @property
+    def name(self) -> str:
+        return "IB CSV importer"
+    
+    def prepare(self, journal: JournalEditor, results: SourceResults):
+        results.add_account(self.account)
+        seen_txns = journalindex.seen_ids(journal, 'txn_id_ib', self.index_path)
+        metrics.file_stats(self, None).count('seen_ids', len(seen_txns))
+        
+        for path, entries in self._parsed_files():
+            stats = metrics.file_stats(self, path)
+            with stats.phase('parse'):
+                entries = stats.collect(entries)
+            for entry in entries:
+                if not isinstance(entry, Transaction): continue
+                if entry.meta.get('txn_id_ib') in seen_txns:
+                    stats.skip('in journal')
+                else:
+                    stats.count('entries')
+                    results.add_pending_entry(ImportResult(date=entry.date, entries=[entry], info={'type': 'application/csv', 'filename':'ibfile'}))
+
+    def _parsed_files(self):
+        paths = [os.path.join(self.directory, filename) for filename in sorted(os.listdir(self.directory))]
+        if self.cache is None and self.workers <= 1:
+            return ((path, self.iter_file(path)) for path in paths)
+        return parallel.parse_files(paths, functools.partial(parse_statement, account=self.account), self.workers, self.cache)
+
+    def handle_file(self, file_path):
+        return parse_statement(file_path, self.account)
+
+    def iter_file(self, file_path):
+        return IBStatement(file_path, self.account).iter_entries()
+
+
+def parse_statement(file_path, account):
+    """Returns the entries of one activity statement; safe to run in a worker process."""
+    return list(IBStatement(file_path, account).iter_entries())
+
+
+class IBStatement:
+    """The parsing of one activity statement into entries of `account`."""
+
+    def __init__(self, file_path, account):
+        self.file_path = file_path
+        self.account = account
+        self.stats = metrics.file_stats(self, file_path)
+
+    def iter_entries(self):
+        """Yields the entries of the statement while reading it.
+
+        Each section's handler is looked up once, at its header row. Rows of
+        sections without a handler (Open Positions, Mark-to-Market, ...) are
+        skipped without being turned into dicts.
+        """
+        handlers = self._section_handlers()
+        handler = None
+        cur_header = None
+        with open(self.file_path, 'r') as infile:
+            for index, line in enumerate(self.stats.rows(csv.reader(infile))):
+                if line[1] == 'Header':
+                    handler = handlers.get(line[0])
+                    cur_header = line[1:]
+                    continue
+                if handler is None:
+                    self.stats.skip('unhandled section')
+                    continue
+                txn = handler(dict(zip(cur_header, line[1:])))
+                if txn is None:
+                    continue
+                date, desc, postings = txn
+                meta = data.new_metadata(self.file_path, index)
+                meta['txn_id_ib'] = hexmd5(line)
+                yield data.Transaction(meta, date, '*', None, desc, data.EMPTY_SET, set(), postings)
+
+    def _section_handlers(self):
+        handlers = {
+            section: functools.partial(self._handle_cash, date_column, counter_account, keep)
+            for section, (date_column, counter_account, keep) in CASH_SECTIONS.items()
+        }
+        # Trades need the running position per symbol, for this file only.
+        handlers['Trades'] = functools.partial(self._handle_trade, {})
+        return handlers
+
+    def _handle_cash(self, date_column, counter_account, keep, line_dict):
+        if not keep(line_dict):
+            self.stats.skip('total row')
+            return None
+        date = parse_date(line_dict[date_column])
+        units = amount.Amount(parse_english(line_dict['Amount']), intern_currency(line_dict['Currency']))
+        return date, line_dict['Description'], [
+            data.Posting(self.account, units, None, None, None, None),
+            data.Posting(counter_account, -units, None, None, None, None),
+        ]
+
+    def _handle_trade(self, portfolio, line_dict):
+        if line_dict['DataDiscriminator'] != 'Order':
+            self.stats.skip('total row')
+            return None
+        asset_category = line_dict['Asset Category']
+        if asset_category.startswith('Forex'):
+            symbol = line_dict['Symbol']
+            cur1, cur2 = line_dict['Symbol'].split('.')
+            quantity = parse_english(line_dict['Quantity'])
+            trade_price = parse_english(line_dict['T. Price'])
+            fees = amount.Amount(abs(parse_english(line_dict['Comm in EUR'])), 'EUR')
+            increment_cur1 = amount.Amount(quantity, cur1)
+            increment_cur2 = amount.Amount(parse_english(line_dict['Proceeds']), cur2)
+            date = parse_datetime(line_dict['Date/Time'])
+            desc = '{} - {} @ {}'.format(quantity, symbol, line_dict['T. Price'])
+
+            postings = [
+                data.Posting(self.account, increment_cur1, None, amount.Amount(trade_price, cur2), None, None),
+                data.Posting(self.account, increment_cur2, None, None, None, None),
+                data.Posting('Expenses:Fees:Brokerage', fees, None, None, None, None),
+                data.Posting(self.account, -fees, None, None, None, None),
+            ]
+            return date, desc, postings
+
+        if asset_category.startswith('Stocks') or asset_category.startswith('Equity and Index Options'):
+            is_options = 'Options' in asset_category
+            symbol = line_dict['Symbol'].replace(' ', '_')
+            quantity = parse_english(line_dict['Quantity'])
+            trade_price = parse_english(line_dict['T. Price'])
+            if is_options:
+                trade_price *= 100
+            currency = intern_currency(line_dict['Currency'])
+            rate = position.Cost(trade_price, currency, None, None)
+            comm_fee = parse_english(line_dict['Comm/Fee'])
+            fees = amount.Amount(abs(comm_fee), currency)
+            date = parse_datetime(line_dict['Date/Time'])
+            desc = '{} - {} @ {}'.format(quantity, symbol, line_dict['T. Price'])
+            cash_amount = amount.Amount(parse_english(line_dict['Proceeds']) + comm_fee, currency)
+            if quantity > 0:
+                basis = None
+            else:
+                basis = rate
+            if symbol not in portfolio:
+                portfolio[symbol] = 0
+            postings = [
+                data.Posting(self.account, cash_amount, None, None, None, None),
+                data.Posting('Expenses:Fees:Brokerage', fees, None, None, None, None),
+                data.Posting('Assets:Stock', amount.Amount(quantity, symbol), basis, amount.Amount(trade_price, currency), None, None),
+            ]
+            if trade_price == 0 or (abs(portfolio[symbol]) + quantity < abs(portfolio[symbol])):
+                postings.append(data.Posting('Income:TradingProfit', None, None, None, None, None))
+            portfolio[symbol] += quantity
+            return date, desc, postings
+
+        self.stats.skip('asset category')
+        return None
 
 def load(spec, log_status):
-    return IBSource(log_status=log_status, **spec)
\ No newline at end of file
+    return IBSource(log_status=log_status, **spec)
\ No newline at end of file
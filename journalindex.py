@@ -0,0 +1,102 @@
+import os
+import pickle
+import zlib
+
+from beancount.core.data import Transaction
+
+import atomicfile
+
+# An index file written with another layout is rebuilt from scratch.
+INDEX_FORMAT = 2
+
+
+def _transaction_ids(entries, key):
+    return {
+        entry.meta[key]
+        for entry in entries
+        if isinstance(entry, Transaction) and entry.meta.get(key)
+    }
+
+
+class JournalIndex:
+    """The `key` metadata values of the transactions in a set of journal files.
+
+    Kept on disk in `path` with the size and mtime of every file, and the
+    union of all their ids. On update() nothing is scanned while no file
+    changed; otherwise only the already parsed entries of the changed
+    files are, never the files themselves.
+    """
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.files = {}
+        self._ids = frozenset()
+        record = self._load()
+        if record is not None and record["format"] == INDEX_FORMAT and record["key"] == key:
+            self.files = record["files"]
+            self._ids = record["ids"]
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as fd:
+                return pickle.loads(zlib.decompress(fd.read()))
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError):
+            return None
+
+    def _store(self):
+        with atomicfile.replace(self.path, "wb") as out:
+            record = {
+                "format": INDEX_FORMAT,
+                "key": self.key,
+                "files": self.files,
+                "ids": self._ids,
+            }
+            out.write(zlib.compress(pickle.dumps(record, pickle.HIGHEST_PROTOCOL)))
+
+    def update(self, entries, filenames):
+        """Brings the index up to date with `filenames`, whose parsed
+        `entries` are given; returns the known ids."""
+        stats = {}
+        stale = set()
+        for filename in filenames:
+            stat = os.stat(filename)
+            stats[filename] = (stat.st_size, stat.st_mtime_ns)
+            known = self.files.get(filename)
+            if known is None or (known["size"], known["mtime_ns"]) != stats[filename]:
+                stale.add(filename)
+        if not stale and stats.keys() == self.files.keys():
+            return self._ids
+        ids = {filename: set() for filename in stale}
+        for entry in entries:
+            if isinstance(entry, Transaction) and entry.meta.get("filename") in ids:
+                value = entry.meta.get(self.key)
+                if value:
+                    ids[entry.meta["filename"]].add(value)
+        files = {}
+        for filename, (size, mtime_ns) in sorted(stats.items()):
+            if filename in stale:
+                file_ids = frozenset(ids[filename])
+            else:
+                file_ids = self.files[filename]["ids"]
+            files[filename] = {"size": size, "mtime_ns": mtime_ns, "ids": file_ids}
+        self.files = files
+        self._ids = frozenset().union(*(record["ids"] for record in files.values()))
+        self._store()
+        return self._ids
+
+    def ids(self):
+        return self._ids
+
+
+def seen_ids(journal, key, index_path=None):
+    """Returns the `key` values of the journal's transactions.
+
+    With `index_path`, they come from a JournalIndex over the journal's files,
+    which only scans journal.all_entries when one of the files changed.
+    """
+    if index_path:
+        return JournalIndex(index_path, key).update(
+            journal.all_entries, journal.journal_filenames
+        )
+    return _transaction_ids(journal.all_entries, key)
@@ -0,0 +1,104 @@
+import json
+from json.decoder import WHITESPACE
+
+# Large enough that most rows are decoded without refilling the buffer.
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """A window over a text stream that JSON values are decoded from."""
+
+    def __init__(self, fd, chunk_size):
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+
+    def fill(self):
+        """Appends the next chunk, dropping what was consumed; False at EOF."""
+        chunk = self.fd.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """The next non-whitespace character, or "" at the end of the stream."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(
+                "Expecting one of {!r}".format(chars), self.buf, self.pos
+            )
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # Every value here is followed by a separator. Without one in the
+            # buffer, a number like "1." may go on in the next chunk.
+            after = WHITESPACE.match(self.buf, end).end()
+            if (after == len(self.buf) or self.buf[after] not in ",:]}") and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _items(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(",]") == "]":
+            return
+
+
+def iter_array(fd, key, chunk_size=CHUNK_SIZE):
+    """Yields the items of the array under `key` in the JSON object in `fd`.
+
+    Reads `fd` a chunk at a time and decodes one item at a time, so memory
+    is bounded by the largest item rather than the document. Other members
+    of the object are decoded and dropped. Several objects concatenated in
+    one file, like appended API dumps, are read one after the other; each
+    must have `key`, as with json.load(fd)[key].
+    """
+    reader = _Reader(fd, chunk_size)
+    while True:
+        reader.expect("{")
+        found = False
+        if reader.peek() == "}":
+            reader.pos += 1
+        else:
+            while True:
+                name = reader.value()
+                reader.expect(":")
+                if name == key and not found:
+                    found = True
+                    yield from _items(reader)
+                else:
+                    reader.value()
+                if reader.expect(",}") == "}":
+                    break
+        if not found:
+            raise KeyError(key)
+        if not reader.peek():
+            return
@@ -0,0 +1,192 @@
+"""Per-importer, per-file counters and phase timings.
+
+Recording is off unless enable() is called or the IMPORTER_METRICS
+environment variable names a file, which is then written when the process
+exits: Prometheus text if it ends in ".prom", JSON otherwise. While it is
+off, file_stats() returns NULL, whose methods do nothing and hand
+iterables back untouched, so instrumented code runs as it would without.
+
+Importers record what they see through the FileStats of their file:
+
+    stats = metrics.file_stats(self, file)
+    with stats.phase("build"):
+        for row in stats.rows(reader):
+            ...
+            stats.skip("not COMPLETED")
+
+Numbers are recorded in the process doing the work: rows and skips
+counted inside a parse worker of parallel.parse_files() are not collected.
+"""
+import atexit
+import collections
+import contextlib
+import json
+import os
+import time
+
+from beancount.ingest.extract import DUPLICATE_META
+
+ENV_VAR = "IMPORTER_METRICS"
+
+
+class FileStats:
+    """What one importer did with one file."""
+
+    def __init__(self, importer, filename):
+        self.importer = importer
+        self.filename = filename
+        self.seconds = collections.Counter()
+        self.counts = collections.Counter()
+        self.skipped = collections.Counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    def collect(self, iterable):
+        """Runs `iterable` to the end, so its work falls in the current phase."""
+        return list(iterable)
+
+    def rows(self, iterable):
+        """Yields the rows of `iterable`, counting them as read."""
+        for row in iterable:
+            self.counts["rows"] += 1
+            yield row
+
+    def skip(self, reason, rows=1):
+        self.skipped[reason] += rows
+
+    def count(self, name, value=1):
+        self.counts[name] += value
+
+    def emitted(self, entries):
+        self.counts["entries"] += len(entries)
+        self.counts["duplicates"] += sum(
+            1 for entry in entries if entry.meta.get(DUPLICATE_META)
+        )
+
+    def to_json(self):
+        return {
+            "importer": self.importer,
+            "file": self.filename,
+            "seconds": dict(self.seconds),
+            "counts": dict(self.counts),
+            "skipped": dict(self.skipped),
+        }
+
+
+class _NullStats:
+    """The FileStats used while recording is off."""
+
+    def phase(self, name):
+        return _NO_PHASE
+
+    def collect(self, iterable):
+        return iterable
+
+    def rows(self, iterable):
+        return iterable
+
+    def skip(self, reason, rows=1):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def emitted(self, entries):
+        pass
+
+
+NULL = _NullStats()
+_NO_PHASE = contextlib.nullcontext()
+
+
+def _label(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+class Run:
+    """The FileStats recorded since enable()."""
+
+    def __init__(self):
+        self.files = {}
+
+    def file_stats(self, importer, filename):
+        key = (importer, filename)
+        stats = self.files.get(key)
+        if stats is None:
+            stats = self.files[key] = FileStats(importer, filename)
+        return stats
+
+    def to_json(self):
+        return {"files": [stats.to_json() for stats in self.files.values()]}
+
+    def to_prometheus(self):
+        samples = collections.defaultdict(list)
+        for stats in self.files.values():
+            labels = 'importer="{}",file="{}"'.format(
+                _label(stats.importer), _label(stats.filename or "")
+            )
+            for phase, seconds in stats.seconds.items():
+                samples["importer_phase_seconds_total"].append(
+                    ('{},phase="{}"'.format(labels, _label(phase)), seconds)
+                )
+            for name, value in stats.counts.items():
+                samples["importer_{}_total".format(name)].append((labels, value))
+            for reason, rows in stats.skipped.items():
+                samples["importer_skipped_rows_total"].append(
+                    ('{},reason="{}"'.format(labels, _label(reason)), rows)
+                )
+        lines = []
+        for metric, values in sorted(samples.items()):
+            lines.append("# TYPE {} counter".format(metric))
+            lines.extend("{}{{{}}} {}".format(metric, labels, value) for labels, value in values)
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        with open(path, "w") as fd:
+            if path.endswith(".prom"):
+                fd.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), fd, indent=1)
+                fd.write("\n")
+
+
+_run = None
+
+
+def enable():
+    """Starts recording and returns the Run the numbers go into."""
+    global _run
+    if _run is None:
+        _run = Run()
+    return _run
+
+
+def disable():
+    global _run
+    _run = None
+
+
+def file_stats(importer, file):
+    """The FileStats of `importer` for `file`, or NULL while recording is off.
+
+    `importer` is an importer, source or parser object, known by the module
+    defining it, or a name; `file` is a path, a beancount FileMemo, or None
+    for numbers about the importer as a whole.
+    """
+    if _run is None:
+        return NULL
+    if not isinstance(importer, str):
+        importer = type(importer).__module__
+    if file is not None and not isinstance(file, str):
+        file = file.name
+    return _run.file_stats(importer, file)
+
+
+if os.environ.get(ENV_VAR):
+    atexit.register(enable().write, os.environ[ENV_VAR])
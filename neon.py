@@ -5,9 +5,15 @@ from beancount.core.data import Transaction
 from beancount.core.data import Posting
 from beancount.core import data
 from beancount.core.amount import Amount
-from beancount.ingest import importer
 from beancount.core.number import Decimal
 
+import metrics
+import signatures
+from amounts import amount_parser
+from dates import DateParser
+from schema import RowSchema
+from streaming import Record, StreamingImporter
+
 import pdb
 
 
@@ -15,22 +21,13 @@ class InvalidFormatError(Exception):
     pass
 
 
-def fmt_number_de(value: str) -> Decimal:
-    thousands_sep = "."
-    decimal_sep = ","
-
-    return Decimal(value.replace(thousands_sep, "").replace(decimal_sep, "."))
-
+parse_amount = amount_parser(lenient=True)
 
-def DecimalOrZero(value):
-    # for string to number conversion with empty strings
-    try:
-        return Decimal(value)
-    except:
-        return Decimal(0.0)
 
+class NeonImporter(StreamingImporter):
+    schema = RowSchema("Date", "Amount", "Description", "Category")
+    signature = signatures.CsvHeader(schema.columns, delimiter=";")
 
-class NeonImporter(importer.ImporterProtocol):
     def __init__(self, account, currency="CHF", file_encoding="utf-8", manual_fixes=0):
 
         self.account = account
@@ -59,47 +56,53 @@ class NeonImporter(importer.ImporterProtocol):
         return datetime.now
 
     def identify(self, file):
-        return "neon" in file.name
+        return signatures.identify(self, file)
 
-    def extract(self, file, existing_entries=None):
-        entries = []
+    def records(self, file):
+        stats = metrics.file_stats(self, file)
         with open(file.name, encoding=self.file_encoding) as fd:
 
             reader = csv.reader(fd, delimiter=self.delimiter)
 
-            header = next(reader)  # skip header line
-            amount_index = header.index("Amount")
-            date_index = header.index("Date")
-            category_index = header.index("Category")
-            description_index = header.index("Description")
+            fields = self.schema.compile(next(reader))  # skip header line
+            parse_date = DateParser("%Y-%m-%d")
 
             # Data entries
-            for i, row in enumerate(reader):
+            for i, row in enumerate(stats.rows(reader)):
                 if len(row) == 0:  # "end" of bank statment
                     break
 
-                meta = data.new_metadata(file.name, i)
-                date = datetime.strptime(row[date_index], "%Y-%m-%d").date()
-                amount = Amount(DecimalOrZero(row[amount_index]), self.currency)
-                description = row[description_index]
-                metadata = {"category": row[category_index]}
+                date_value, amount_value, description, category = fields(row)
 
-                trans = Transaction(
-                    meta,
-                    date,
-                    self.FLAG,
+                yield Record(
+                    i,
+                    parse_date(date_value),
+                    Amount(parse_amount(amount_value), self.currency),
                     "",
                     description,
-                    data.EMPTY_SET,
-                    data.EMPTY_SET,
-                    [],
-                )
-                trans.postings.append(
-                    Posting(self.account, amount, None, None, None, None)
-                )
-                trans.postings.append(
-                    Posting("Expenses:TBD", -amount, None, None, None, None)
+                    category,
+                    None,
+                    None,
                 )
-                entries.append(trans)
 
-        return entries
+    def build(self, record, filename):
+        meta = data.new_metadata(filename, record.lineno, {"category": record.category})
+        amount = record.amount
+
+        trans = Transaction(
+            meta,
+            record.date,
+            self.FLAG,
+            record.payee,
+            record.narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [],
+        )
+        trans.postings.append(
+            Posting(self.account, amount, None, None, None, None)
+        )
+        trans.postings.append(
+            Posting("Expenses:TBD", -amount, None, None, None, None)
+        )
+        return trans
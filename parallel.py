@@ -0,0 +1,40 @@
+import concurrent.futures
+
+
+def parse_files(paths, parse, workers=1, cache=None):
+    """Yields (path, entries) for every path, in the order of `paths`.
+
+    `parse` must be a pure function of the path, and picklable when
+    workers > 1: files that are not in `cache` are then spread over a
+    process pool. Results are still yielded in input order, so the output
+    is the same as a serial run's.
+    """
+    paths = list(paths)
+    results = {}
+    stamps = {}
+    if cache is not None:
+        for path in paths:
+            entries, stamp = cache.lookup(path)
+            if entries is None:
+                stamps[path] = stamp
+            else:
+                results[path] = entries
+    todo = [path for path in paths if path not in results]
+
+    if workers > 1 and len(todo) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, entries in zip(todo, pool.map(parse, todo)):
+                results[path] = entries
+                if cache is not None:
+                    cache.store(path, stamps[path], entries)
+        for path in paths:
+            yield path, results.pop(path)
+        return
+
+    for path in paths:
+        entries = results.pop(path, None)
+        if entries is None:
+            entries = parse(path)
+            if cache is not None:
+                cache.store(path, stamps[path], entries)
+        yield path, entries
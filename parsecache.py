@@ -0,0 +1,106 @@
+import hashlib
+import os
+import pickle
+import zlib
+
+import atomicfile
+
+# Stamped on every cache file; entries stored in another layout are
+# parsed again.
+CACHE_FORMAT = 1
+
+
+def source_version(*paths, params=()):
+    """Hashes the given source files, e.g. an importer and its helpers.
+
+    Used as the cache version, so entries parsed by older code are dropped
+    as soon as any of the files changes. `params` are the arguments the
+    parser is called with, like the accounts it books on: entries parsed
+    with other arguments are dropped too.
+    """
+    digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+    for path in paths:
+        with open(path, "rb") as fd:
+            digest.update(fd.read())
+    digest.update(repr(tuple(params)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParsedFileCache:
+    """Entries parsed from statement files, kept on disk between runs.
+
+    Each statement gets one zlib-compressed pickle in `directory`, keyed by
+    its path and stamped with its size, mtime, content hash and `version`.
+    A file whose size and mtime are unchanged is trusted without reading
+    it; otherwise its content hash decides whether it is parsed again.
+    """
+
+    def __init__(self, directory, version):
+        self.directory = directory
+        self.version = version
+        os.makedirs(directory, exist_ok=True)
+
+    def _cache_path(self, path):
+        key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + ".pickle.z")
+
+    def _load(self, cache_path):
+        try:
+            with open(cache_path, "rb") as fd:
+                return pickle.loads(zlib.decompress(fd.read()))
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError):
+            return None
+
+    def _store(self, cache_path, record):
+        with atomicfile.replace(cache_path, "wb") as out:
+            out.write(zlib.compress(pickle.dumps(record, pickle.HIGHEST_PROTOCOL)))
+
+    def lookup(self, path):
+        """Returns (entries, stamp); entries is None if `path` must be parsed.
+
+        The stamp describes the file as it was looked up and is passed back
+        to store() with the freshly parsed entries.
+        """
+        stat = os.stat(path)
+        record = self._load(self._cache_path(path))
+        if record is not None and record["version"] == self.version:
+            if (record["size"], record["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                return record["entries"], None
+            content_hash = file_hash(path)
+            if record["hash"] == content_hash:
+                record.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                self._store(self._cache_path(path), record)
+                return record["entries"], None
+        else:
+            content_hash = file_hash(path)
+        return None, (stat.st_size, stat.st_mtime_ns, content_hash)
+
+    def store(self, path, stamp, entries):
+        size, mtime_ns, content_hash = stamp
+        self._store(
+            self._cache_path(path),
+            {
+                "version": self.version,
+                "path": path,
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "hash": content_hash,
+                "entries": entries,
+            },
+        )
+
+    def get(self, path, parse):
+        """Returns the entries of `path`, calling parse(path) only if needed."""
+        entries, stamp = self.lookup(path)
+        if entries is None:
+            entries = parse(path)
+            self.store(path, stamp, entries)
+        return entries
@@ -0,0 +1,172 @@
+import collections
+import hashlib
+import math
+import pickle
+import re
+import zlib
+
+from beancount.core import data
+
+import atomicfile
+
+# A model saved with another layout is ignored and trained again.
+MODEL_FORMAT = 1
+
+# Counter-postings the importers emit when they cannot tell the account.
+PLACEHOLDER_ACCOUNTS = frozenset(
+    {"Expenses:TBD", "Income:TBD", "Expenses:FIXME", "Income:FIXME"}
+)
+LEARNED_ROOTS = ("Expenses:", "Income:")
+
+_WORD = re.compile(r"[^\W\d_]{2,}")
+
+
+def tokens(entry, units=None):
+    """The features of a transaction: its words, category and direction."""
+    text = "{} {}".format(entry.payee or "", entry.narration or "")
+    features = set(_WORD.findall(text.casefold()))
+    category = entry.meta.get("category") if entry.meta else None
+    if category:
+        features.add("category:" + str(category).casefold())
+    if units is not None and units.number is not None:
+        features.add("sign:-" if units.number < 0 else "sign:+")
+    return features
+
+
+def _entry_key(entry):
+    postings = tuple((posting.account, str(posting.units)) for posting in entry.postings)
+    key = repr((entry.date, entry.payee, entry.narration, postings)).encode("utf-8")
+    return hashlib.blake2b(key, digest_size=8).digest()
+
+
+class AccountPredictor:
+    """Naive Bayes over transaction words, predicting counter-posting accounts.
+
+    The model is a token -> account frequency index learned from the
+    Expenses and Income postings of the ledger. Predicting only looks at
+    the accounts seen with the row's own tokens, so its cost grows with the
+    tokens of the row, not with the ledger or the chart of accounts.
+
+    With `path`, the model is kept on disk. update() learns only from
+    entries dated after the last ones it saw, so each run trains on what
+    was added since; entries back-dated before that are not picked up.
+    """
+
+    def __init__(self, path=None, alpha=1.0):
+        self.path = path
+        self.alpha = alpha
+        self.account_docs = collections.Counter()
+        self.account_tokens = collections.Counter()
+        self.token_accounts = collections.defaultdict(collections.Counter)
+        self.total_docs = 0
+        self.last_date = None
+        self.last_keys = set()
+        self._updated_for = None
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as fd:
+                record = pickle.loads(zlib.decompress(fd.read()))
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError):
+            return
+        if record.get("format") != MODEL_FORMAT:
+            return
+        self.account_docs = record["account_docs"]
+        self.account_tokens = record["account_tokens"]
+        self.token_accounts = record["token_accounts"]
+        self.total_docs = sum(self.account_docs.values())
+        self.last_date = record["last_date"]
+        self.last_keys = record["last_keys"]
+
+    def save(self):
+        with atomicfile.replace(self.path, "wb") as out:
+            record = {
+                "format": MODEL_FORMAT,
+                "account_docs": self.account_docs,
+                "account_tokens": self.account_tokens,
+                "token_accounts": self.token_accounts,
+                "last_date": self.last_date,
+                "last_keys": self.last_keys,
+            }
+            out.write(zlib.compress(pickle.dumps(record, pickle.HIGHEST_PROTOCOL)))
+
+    def learn(self, entry):
+        for posting in entry.postings:
+            account = posting.account
+            if account in PLACEHOLDER_ACCOUNTS or not account.startswith(LEARNED_ROOTS):
+                continue
+            features = tokens(entry, posting.units)
+            self.account_docs[account] += 1
+            self.total_docs += 1
+            self.account_tokens[account] += len(features)
+            for token in features:
+                self.token_accounts[token][account] += 1
+
+    def update(self, entries):
+        """Learns from the transactions of `entries` not seen yet.
+
+        bean-extract hands the same ledger list to every importer, so this
+        runs once per list and saves the model if it learned anything.
+        """
+        if entries is None or entries is self._updated_for:
+            return
+        self._updated_for = entries
+        since, seen = self.last_date, frozenset(self.last_keys)
+        learned = False
+        for entry in entries:
+            if not isinstance(entry, data.Transaction):
+                continue
+            if since is not None and entry.date < since:
+                continue
+            key = _entry_key(entry)
+            if entry.date == since and key in seen:
+                continue
+            self.learn(entry)
+            learned = True
+            if self.last_date is None or entry.date > self.last_date:
+                self.last_date, self.last_keys = entry.date, {key}
+            elif entry.date == self.last_date:
+                self.last_keys.add(key)
+        if learned and self.path:
+            self.save()
+
+    def predict(self, features):
+        """Returns the most likely account for `features`, or None."""
+        candidates = set()
+        known = []
+        for token in features:
+            accounts = self.token_accounts.get(token)
+            if accounts:
+                known.append(accounts)
+                # The sign goes with nearly every account: it weighs in the
+                # score but does not nominate candidates.
+                if not token.startswith("sign:"):
+                    candidates.update(accounts)
+        if not candidates:
+            return None
+        total_docs = self.total_docs
+        vocabulary = len(self.token_accounts)
+        best, best_score = None, -math.inf
+        for account in candidates:
+            denominator = math.log(self.account_tokens[account] + self.alpha * vocabulary)
+            score = math.log(self.account_docs[account] / total_docs)
+            for accounts in known:
+                score += math.log(accounts.get(account, 0) + self.alpha) - denominator
+            if score > best_score:
+                best, best_score = account, score
+        return best
+
+    def classify(self, entries, existing_entries=None):
+        """Yields `entries` with placeholder counter-postings predicted."""
+        self.update(existing_entries)
+        for entry in entries:
+            if isinstance(entry, data.Transaction):
+                for index, posting in enumerate(entry.postings):
+                    if posting.account not in PLACEHOLDER_ACCOUNTS:
+                        continue
+                    account = self.predict(tokens(entry, posting.units))
+                    if account is not None:
+                        entry.postings[index] = posting._replace(account=account)
+            yield entry
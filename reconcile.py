@@ -0,0 +1,136 @@
+"""Checks a statement's running balances against the amounts booked.
+
+Revolut, Wise and CSOB give the account balance after every row, kept as
+"balance" metadata. reconcile() adds up, in integer minor units, what each
+Transaction books on the account and compares that with the balance of
+every row, in one pass, stopping at the first row where they differ. It
+can also turn the balances into Balance directives, at most one per
+currency and day or month, rather than one per row, so that bean-check
+does not have to verify every row.
+"""
+import collections
+import datetime
+
+from beancount.core import data
+from beancount.core.number import Decimal
+
+from amounts import minor_units
+
+# Decimal places of the integer units amounts are added up in, at least;
+# a currency gets more as soon as one of its amounts has more.
+PLACES = 2
+
+# `index` is the row's position in the statement's entries; `expected`
+# is what the rows before it add up to.
+Mismatch = collections.namedtuple("Mismatch", "index entry expected reported")
+Reconciliation = collections.namedtuple("Reconciliation", "mismatch balances")
+
+
+class BalanceError(ValueError):
+    def __init__(self, filename, mismatch):
+        entry = mismatch.entry
+        super().__init__(
+            "{}: transaction {} on {} ({}) reports a balance of {}, "
+            "the rows before add up to {}".format(
+                filename,
+                mismatch.index + 1,
+                entry.date,
+                entry.narration or entry.payee,
+                mismatch.reported,
+                mismatch.expected,
+            )
+        )
+        self.mismatch = mismatch
+
+
+def _next_day(day):
+    return day + datetime.timedelta(days=1)
+
+
+def _next_month(month):
+    year, month = month
+    return datetime.date(year + month // 12, month % 12 + 1, 1)
+
+
+# Period -> (the period of a date, the first day after a period).
+PERIODS = {
+    "day": (lambda date: date, _next_day),
+    "month": (lambda date: (date.year, date.month), _next_month),
+}
+
+
+def chronological(entries):
+    """The indices of `entries` from the oldest row, whichever way the
+    statement lists them."""
+    if len(entries) > 1 and entries[-1].date < entries[0].date:
+        return range(len(entries) - 1, -1, -1)
+    return range(len(entries))
+
+
+def reconcile(entries, account, period=None):
+    """Checks the "balance" metadata of a statement's `entries`.
+
+    Returns a Reconciliation: the first Mismatch, or None, and with
+    `period` "day" or "month", the Balance directives of `account` at the
+    start of each period following one with balances. Only balances up to
+    the first mismatch are asserted, and the statement's last period has
+    none, as later statements may still add rows to it.
+    """
+    period_of, period_end = PERIODS[period] if period else (None, None)
+    places = collections.defaultdict(lambda: PLACES)
+    running = {}
+    # Currency -> (period, last balance Amount, its entry) not yet asserted.
+    pending = {}
+    balances = []
+    for index in chronological(entries):
+        entry = entries[index]
+        for posting in entry.postings:
+            if posting.account == account and posting.units.currency in running:
+                # Before reading the total, which _units() may rescale.
+                units = _units(posting.units, places, running)
+                running[posting.units.currency] += units
+        reported = entry.meta.get("balance")
+        if not isinstance(reported, data.Amount):
+            continue
+        currency = reported.currency
+        units = _units(reported, places, running)
+        expected = running.get(currency)
+        if expected is not None and expected != units:
+            mismatch = Mismatch(
+                index,
+                entry,
+                data.Amount(Decimal(expected).scaleb(-places[currency]), currency),
+                reported,
+            )
+            return Reconciliation(mismatch, balances)
+        running[currency] = units
+        if period_of is None:
+            continue
+        current = period_of(entry.date)
+        last = pending.get(currency)
+        if last is not None and last[0] != current:
+            balances.append(_balance(account, period_end(last[0]), *last[1:]))
+        pending[currency] = (current, reported, entry)
+    return Reconciliation(None, balances)
+
+
+def _units(amount, places, running):
+    """`amount` in minor units of its currency at `places`.
+
+    An amount with more decimals than its currency had so far moves the
+    currency, and its running total, to that many places first.
+    """
+    currency = amount.currency
+    try:
+        return minor_units(amount.number, places[currency])
+    except ValueError:
+        extra = -amount.number.as_tuple().exponent - places[currency]
+        places[currency] += extra
+        if currency in running:
+            running[currency] *= 10 ** extra
+        return minor_units(amount.number, places[currency])
+
+
+def _balance(account, date, amount, entry):
+    meta = data.new_metadata(entry.meta["filename"], entry.meta["lineno"])
+    return data.Balance(meta, date, account, amount, None, None)
@@ -1,18 +1,40 @@
 from dateutil.parser import parse
 from datetime import timedelta, datetime
-from io import StringIO
 
-from beancount.ingest import importer
 from beancount.core import data
 from beancount.core import amount
-from beancount.core.number import D
 
 import csv
+import itertools
 
+import metrics
+import signatures
+from amounts import intern_currency, parse_plain
+from dates import DateParser
+from schema import RowSchema, non_empty
+from streaming import Record, StreamingImporter
 
-class RevolutImporter(importer.ImporterProtocol):
+
+class RevolutImporter(StreamingImporter):
     """An importer for Revolut CSV files."""
 
+    columns = [
+        "Type",
+        "Product",
+        "Started Date",
+        "Completed Date",
+        "Description",
+        "Amount",
+        "Fee",
+        "Currency",
+        "State",
+        "Balance",
+    ]
+    schema = RowSchema(
+        "State", "Started Date", "Amount", "Currency", "Balance", "Description", "Fee"
+    )
+    signature = signatures.CsvHeader(columns)
+
     def __init__(self, account, currency="CHF", file_encoding="utf-8", manual_fixes=0):
 
         self.account = account
@@ -30,77 +52,93 @@ class RevolutImporter(importer.ImporterProtocol):
         return datetime.now
 
     def identify(self, file):
-        return "revolut" in file.name
-
-    def extract(self, file, existing_entries):
-        entries = []
-        has_balance = False
-
-        with StringIO(file.contents()) as csvfile:
-            reader = csv.DictReader(
-                csvfile,
-                [
-                    "Type",
-                    "Product",
-                    "Started Date",
-                    "Completed Date",
-                    "Description",
-                    "Amount",
-                    "Fee",
-                    "Currency",
-                    "State",
-                    "Balance",
-                ],
-                delimiter=",",
-                skipinitialspace=True,
+        return signatures.identify(self, file)
+
+    def records(self, file):
+        stats = metrics.file_stats(self, file)
+        with open(file.name, encoding=self.file_encoding) as csvfile:
+            reader = non_empty(
+                csv.reader(csvfile, delimiter=",", skipinitialspace=True)
             )
             next(reader)
-            for row in reader:
-
-                if row["State"] != "COMPLETED":
+            fields = self.schema.compile(self.columns, pad_short_rows=True)
+            parse_date = DateParser(fallback=lambda value: parse(value).date())
+
+            head = list(itertools.islice(reader, 20))
+            started = [fields(row)[1] for row in head]
+            parse_date.sniff(value.split()[0] for value in started if value)
+            for row in stats.rows(itertools.chain(head, reader)):
+                (
+                    state,
+                    started_date,
+                    amount_value,
+                    currency,
+                    balance,
+                    description,
+                    fee_value,
+                ) = fields(row)
+
+                if state != "COMPLETED":
+                    stats.skip("not COMPLETED")
                     continue
 
-                book_date = parse(row["Started Date"].split()[0].strip()).date()
-
-                amt = amount.Amount(D(row["Amount"]), row["Currency"])
-
-                meta = data.new_metadata(
-                    file.name,
+                currency = intern_currency(currency)
+                fee_number = parse_plain(fee_value)
+                yield Record(
                     0,
-                    {"balance": data.Amount(D(row["Balance"]), row["Currency"])},
-                )
-                entry = data.Transaction(
-                    meta,
-                    book_date,
-                    "*",
+                    parse_date(started_date.split()[0].strip()),
+                    amount.Amount(parse_plain(amount_value), currency),
                     "",
-                    row["Description"].strip(),
-                    data.EMPTY_SET,
-                    data.EMPTY_SET,
-                    [
-                        data.Posting(self.account, amt, None, None, None, None),
-                        data.Posting(
-                            "Expenses:TBD",
-                            -amt,
-                            None,
-                            None,
-                            None,
-                            None,
-                        ),
-                    ],
+                    description.strip(),
+                    None,
+                    data.Amount(parse_plain(balance), currency),
+                    amount.Amount(fee_number, currency) if fee_number != 0 else None,
+                )
+
+    def build(self, record, filename):
+        amt = record.amount
+        meta = data.new_metadata(filename, record.lineno, {"balance": record.balance})
+        entry = data.Transaction(
+            meta,
+            record.date,
+            "*",
+            record.payee,
+            record.narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [
+                data.Posting(self.account, amt, None, None, None, None),
+                data.Posting(
+                    "Expenses:TBD",
+                    -amt,
+                    None,
+                    None,
+                    None,
+                    None,
+                ),
+            ],
+        )
+        if record.fee is not None:
+            # Taken from the account on top of the amount, as the balance
+            # column shows.
+            entry.postings.append(
+                data.Posting(
+                    self.account,
+                    -record.fee,
+                    None,
+                    None,
+                    None,
+                    None,
                 )
-                if D(row["Fee"]) != 0:
-                    fee = amount.Amount(D(row["Fee"]), row["Currency"])
-                    entry.postings.append(
-                        data.Posting(
-                            "Expenses:Financial:Fees",
-                            fee,
-                            None,
-                            None,
-                            None,
-                            None,
-                        )
-                    )
-                entries.append(entry)
-
-        return entries
+            )
+            entry.postings.append(
+                data.Posting(
+                    "Expenses:Financial:Fees",
+                    record.fee,
+                    None,
+                    None,
+                    None,
+                    None,
+                )
+            )
+        return entry
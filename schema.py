@@ -0,0 +1,50 @@
+from operator import itemgetter
+
+
+def non_empty(rows):
+    """The rows of a csv.reader that have fields: blank lines are skipped,
+    as csv.DictReader does."""
+    return filter(None, rows)
+
+
+class RowSchema:
+    """The named CSV columns an importer reads.
+
+    compile() resolves the names against a header once per file and returns
+    an accessor mapping a csv.reader row to a tuple of just those fields, in
+    the order they were declared, so the row loops never look up columns.
+    With pad_short_rows, fields missing from a short row read as None, like
+    csv.DictReader's restval.
+    """
+
+    def __init__(self, *columns):
+        self.columns = columns
+
+    def compile(self, header, pad_short_rows=False):
+        positions = {}
+        for i, name in enumerate(header):
+            # Same as header.index(): the first column with a name wins.
+            positions.setdefault(name, i)
+
+        missing = [name for name in self.columns if name not in positions]
+        if missing:
+            raise ValueError(
+                "Columns {} not found in header {}".format(missing, list(header))
+            )
+
+        indexes = [positions[name] for name in self.columns]
+        if len(indexes) == 1:
+            get = lambda row, index=indexes[0]: (row[index],)
+        else:
+            get = itemgetter(*indexes)
+        if not pad_short_rows:
+            return get
+
+        width = max(indexes) + 1
+
+        def get_padded(row):
+            if len(row) < width:
+                row = row + [None] * (width - len(row))
+            return get(row)
+
+        return get_padded
@@ -0,0 +1,158 @@
+import collections
+import csv
+import hashlib
+import re
+
+import filecache
+import metrics
+
+# Enough for every preamble and header line the importers here deal with.
+HEAD_BYTES = 64 * 1024
+
+# A string, with the colon following it if it is an object key, or a bracket.
+_JSON_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"(\s*:)?|[{}\[\]]')
+
+
+class CsvHeader(collections.namedtuple("CsvHeader", "columns line delimiter")):
+    """Files whose `line`-th line has at least `columns`, split on `delimiter`."""
+
+    def __new__(cls, columns, line=0, delimiter=","):
+        return super().__new__(cls, frozenset(columns), line, delimiter)
+
+    @property
+    def key(self):
+        return ("csv", self.line, self.delimiter)
+
+    def matches(self, header):
+        return header is not None and self.columns <= header
+
+
+class JsonKey(collections.namedtuple("JsonKey", "name")):
+    """JSON objects with a top-level key `name`, like "data" or "list"."""
+
+    key = ("json",)
+
+    def matches(self, header):
+        return header is not None and self.name in header
+
+
+class AllOf(collections.namedtuple("AllOf", "signatures")):
+    """Files matching every one of `signatures`, like a preamble line naming
+    the account and the column header further down."""
+
+    def __new__(cls, *signatures):
+        return super().__new__(cls, signatures)
+
+    @property
+    def key(self):
+        return ("all",) + tuple(signature.key for signature in self.signatures)
+
+    def matches(self, header):
+        return header is not None and all(
+            signature.matches(part) for signature, part in zip(self.signatures, header)
+        )
+
+
+def _csv_header(text, line, delimiter):
+    lines = text.splitlines()
+    if line >= len(lines):
+        return None
+    row = next(csv.reader([lines[line]], delimiter=delimiter), [])
+    return frozenset(column.strip() for column in row)
+
+
+def _json_keys(text):
+    """The top-level keys of the JSON object `text` starts with, as far as
+    it goes: the head of a large export ends somewhere inside it."""
+    if not text.lstrip().startswith("{"):
+        return None
+    keys = set()
+    depth = 0
+    for token in _JSON_TOKEN.finditer(text):
+        bracket = token.group()
+        if bracket in "{[":
+            depth += 1
+        elif bracket in "}]":
+            depth -= 1
+            if depth == 0:
+                break
+        elif depth == 1 and token.group(2):
+            keys.add(token.group(1))
+    return frozenset(keys)
+
+
+class Head:
+    """The first HEAD_BYTES of a file and the header values read from them."""
+
+    def __init__(self, raw, size):
+        self.raw = raw
+        # Signatures only depend on these bytes, so they and the size are
+        # all a cached identification needs to be keyed on.
+        self.hash = hashlib.sha256(raw + str(size).encode()).hexdigest()
+        self.text = raw.decode("utf-8-sig", errors="replace")
+        self._headers = {}
+
+    def header(self, key):
+        if key not in self._headers:
+            self._headers[key] = self._read_header(key)
+        return self._headers[key]
+
+    def _read_header(self, key):
+        kind = key[0]
+        if kind == "csv":
+            return _csv_header(self.text, key[1], key[2])
+        if kind == "json":
+            return _json_keys(self.text)
+        if kind == "all":
+            return tuple(self.header(part) for part in key[1:])
+        raise ValueError("Unknown signature kind {!r}".format(kind))
+
+
+def head(file):
+    """Returns the Head of `file`, a path or a beancount FileMemo.
+
+    Parsed once per content, however many importers look at it, see
+    filecache.head.
+    """
+    return filecache.head(file, HEAD_BYTES, Head)
+
+
+def identify(importer, file):
+    """Whether `file` has the header signature `importer` declares."""
+    signature = importer.signature
+    with metrics.file_stats(importer, file).phase("identify"):
+        return signature.matches(head(file).header(signature.key))
+
+
+class Registry:
+    """Finds the importers of a file by header signature instead of asking each.
+
+    A file's header is read once per signature kind, then looked up in a
+    dict of the headers seen so far, so a folder of monthly exports costs
+    one match per distinct header. Results are kept per file hash.
+    """
+
+    def __init__(self, importers):
+        self.kinds = collections.defaultdict(list)
+        for importer in importers:
+            self.kinds[importer.signature.key].append(importer)
+        self._by_header = {}
+        self._by_file = {}
+
+    def find(self, file):
+        file_head = head(file)
+        found = self._by_file.get(file_head.hash)
+        if found is None:
+            found = []
+            for key, importers in self.kinds.items():
+                header = file_head.header(key)
+                if header is None:
+                    continue
+                matching = self._by_header.get((key, header))
+                if matching is None:
+                    matching = self._by_header[(key, header)] = [
+                        importer for importer in importers if importer.signature.matches(header)
+                    ]
+                found.extend(matching)
+            self._by_file[file_head.hash] = found
+        return found
@@ -0,0 +1,89 @@
+import collections
+
+from beancount.ingest import importer
+
+import batch
+import fingerprint
+import metrics
+import reconcile
+
+
+# One statement row, parsed: `amount` is the row's amount as the statement
+# gives it, `balance` the account balance after the row and `fee` what it
+# charged on top, the last two an Amount or None.
+# `category` is the statement's own classification of the row, if it has
+# one; `lineno` is what goes into the entry's metadata.
+Record = collections.namedtuple(
+    "Record", "lineno date amount payee narration category balance fee"
+)
+
+
+class StreamingImporter(importer.ImporterProtocol):
+    """An importer that yields entries one row at a time.
+
+    Subclasses implement records(), which reads the statement straight from
+    the open file handle and yields a Record as soon as a row has been
+    parsed, and build(), which makes a Record into a Transaction. Rows that
+    are not imported are skipped in records(). extract_iter() chains the
+    two, and extract() is only a thin wrapper collecting the stream for
+    beancount.ingest, which expects a list. extract_batch() keeps the
+    Records in columns instead, see batch.TransactionBatch.
+
+    Rows already in the ledger passed as `existing_entries` are flagged as
+    duplicates on the way, and with a `predictor` (a
+    predictor.AccountPredictor) the placeholder counter-postings get the
+    account it predicts. Statements giving the balance after each row can
+    be reconciled, see reconcile.py: with `reconcile_balances` set, a row
+    whose balance does not follow from the amounts booked before it raises
+    reconcile.BalanceError, and with `balance_assertions` "day" or "month"
+    the checked balances are added as Balance directives. With metrics
+    enabled, the time spent building entries and deduplicating them is
+    recorded separately; records() reads and parses each row as its entry
+    is built, so reading the file counts as building.
+    """
+
+    predictor = None
+    reconcile_balances = False
+    balance_assertions = None
+
+    def records(self, file):
+        raise NotImplementedError
+
+    def build(self, record, filename):
+        raise NotImplementedError
+
+    def extract_iter(self, file, existing_entries=None):
+        for record in self.records(file):
+            yield self.build(record, file.name)
+
+    def extract(self, file, existing_entries=None):
+        stats = metrics.file_stats(self, file)
+        with stats.phase("build"):
+            entries = stats.collect(self.extract_iter(file, existing_entries))
+        balances = []
+        if self.reconcile_balances or self.balance_assertions:
+            with stats.phase("reconcile"):
+                entries = list(entries)
+                mismatch, balances = reconcile.reconcile(
+                    entries, self.account, self.balance_assertions
+                )
+            if mismatch is not None:
+                stats.count("balance_mismatches")
+                if self.reconcile_balances:
+                    raise reconcile.BalanceError(file.name, mismatch)
+        with stats.phase("dedup"):
+            # Before classify(), which rewrites the placeholder postings.
+            entries = fingerprint.mark_duplicates(entries, existing_entries, self.account)
+            if self.predictor is not None:
+                entries = self.predictor.classify(entries, existing_entries)
+            entries = list(entries)
+        stats.emitted(entries)
+        stats.count("balances", len(balances))
+        return entries + balances
+
+    def extract_batch(self, file):
+        """The rows of `file` as a batch.TransactionBatch; needs NumPy."""
+        stats = metrics.file_stats(self, file)
+        with stats.phase("batch"):
+            return batch.TransactionBatch.from_records(self, file.name, self.records(file))
+
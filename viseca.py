@@ -1,15 +1,22 @@
-import json
 from datetime import datetime
 
 from beancount.core.data import Transaction
 from beancount.core.data import Posting
 from beancount.core import data
 from beancount.core.amount import Amount
-from beancount.ingest import importer
 from beancount.core.number import Decimal
 
+import jsonstream
+import metrics
+import signatures
+from amounts import intern_currency, quantize
+from dates import DateParser
+from streaming import Record, StreamingImporter
+
+
+class VisecaImporter(StreamingImporter):
+    signature = signatures.JsonKey("list")
 
-class VisecaImporter(importer.ImporterProtocol):
     def __init__(self, account, currency="CHF", file_encoding="utf-8", manual_fixes=0):
 
         self.account = account
@@ -38,22 +45,20 @@ class VisecaImporter(importer.ImporterProtocol):
         return datetime.now
 
     def identify(self, file):
-        return "viseca" in file.name
+        return signatures.identify(self, file)
 
-    def extract(self, file, existing_entries=None):
-        entries = []
+    def records(self, file):
+        stats = metrics.file_stats(self, file)
         with open(file.name, encoding=self.file_encoding) as fd:
-
-            reader = json.load(fd)
-            for i, row in enumerate(reader["list"]):
-                date = datetime.strptime(row["date"], "%Y-%m-%dT%H:%M:%S%z").date()
+            parse_date = DateParser("%Y-%m-%dT%H:%M:%S%z")
+            for i, row in enumerate(stats.rows(jsonstream.iter_array(fd, "list"))):
+                date = parse_date(row["date"])
                 amount = Amount(
-                    Decimal(row["amount"]).quantize(Decimal("0.01")), row["currency"]
+                    quantize(Decimal(row["amount"])), intern_currency(row["currency"])
                 )
                 description = (
                     row["prettyName"] if "prettyName" in row else row["details"]
                 )
-                metadata = {"category": row["pfmCategory"]["name"]}
 
                 if amount.number < 0:
                     # trans = Transaction(
@@ -77,46 +82,52 @@ class VisecaImporter(importer.ImporterProtocol):
                     #     ],
                     # )
                     # entries.append(trans)
-                    pass
-
-                else:
-                    trans = Transaction(
-                        data.new_metadata(file.name, i, metadata),
-                        date,
-                        self.FLAG,
-                        "",
-                        description,
-                        data.EMPTY_SET,
-                        data.EMPTY_SET,
-                        [
-                            Posting(self.account, -amount, None, None, None, None),
-                            Posting("Expenses:TBD", amount, None, None, None, None),
-                        ],
+                    stats.skip("negative amount")
+                    continue
+
+                fee = None
+                if "serviceFees" in row:
+                    serviceFees = row["serviceFees"]
+                    assert all(
+                        x["currency"] == serviceFees[0]["currency"]
+                        for x in serviceFees
+                    ), "All service fees must have the same currency"
+                    fee = Amount(
+                        quantize(sum(Decimal(x["amount"]) for x in serviceFees)),
+                        intern_currency(serviceFees[0]["currency"]),
                     )
+                yield Record(
+                    i, date, amount, "", description, row["pfmCategory"]["name"], None, fee
+                )
+
+    def build(self, record, filename):
+        amount = record.amount
+        metadata = {"category": record.category}
+
+        trans = Transaction(
+            data.new_metadata(filename, record.lineno, metadata),
+            record.date,
+            self.FLAG,
+            record.payee,
+            record.narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [
+                Posting(self.account, -amount, None, None, None, None),
+                Posting("Expenses:TBD", amount, None, None, None, None),
+            ],
+        )
+
+        if record.fee is not None:
+            trans.postings.append(
+                Posting(
+                    "Expenses:Financial:Fees",
+                    record.fee,
+                    None,
+                    None,
+                    None,
+                    None,
+                )
+            )
 
-                    if "serviceFees" in row:
-                        serviceFees = row["serviceFees"]
-                        assert all(
-                            x["currency"] == serviceFees[0]["currency"]
-                            for x in serviceFees
-                        ), "All service fees must have the same currency"
-                        fee_amount = Amount(
-                            Decimal(
-                                sum((Decimal(x["amount"])) for x in serviceFees)
-                            ).quantize(Decimal("0.01")),
-                            serviceFees[0]["currency"],
-                        )
-                        trans.postings.append(
-                            Posting(
-                                "Expenses:Financial:Fees",
-                                fee_amount,
-                                None,
-                                None,
-                                None,
-                                None,
-                            )
-                        )
-
-                    entries.append(trans)
-
-        return entries
+        return trans
@@ -0,0 +1,95 @@
+import collections
+import datetime
+import fcntl
+import hashlib
+import json
+
+import atomicfile
+
+# Stores written with another layout are read as empty.
+STORE_FORMAT = 1
+
+
+def row_key(row):
+    """Identifies a decoded JSON row, whatever its fields."""
+    text = json.dumps(row, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class Watermark(collections.namedtuple("Watermark", "date keys")):
+    """The last imported date of an account and the row keys seen on it."""
+
+    def is_new(self, date, key):
+        return date > self.date or (date == self.date and key not in self.keys)
+
+    def covers_month(self, date):
+        """Whether every row of the monthly export `date` falls in is older."""
+        return (date.year, date.month) < (self.date.year, self.date.month)
+
+
+class WatermarkStore:
+    """Per-account watermarks, kept as JSON in `path`.
+
+    get() returns the watermark as it was when the store was opened, and
+    advance() only moves what is saved: the statements of one run are all
+    compared against the same watermark, whatever order they come in.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._loaded = _read(path)
+        self._next = dict(self._loaded)
+
+    def get(self, account):
+        return self._loaded.get(account)
+
+    def advance(self, account, date, keys):
+        """Records `keys` as seen on `date`, if that is not before the saved mark."""
+        self._next[account] = _later(self._next.get(account), Watermark(date, frozenset(keys)))
+        self._save()
+
+    def _save(self):
+        """Merges the marks with what is on disk now and writes them back.
+
+        Other stores on the same path, like those of parallel workers, may
+        have saved since this one was opened: their marks are kept, and
+        the later one wins where both moved the same account.
+        """
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            marks = _read(self.path)
+            for account, mark in self._next.items():
+                marks[account] = _later(marks.get(account), mark)
+            self._next = marks
+            record = {
+                "format": STORE_FORMAT,
+                "accounts": {
+                    account: {"date": mark.date.isoformat(), "keys": sorted(mark.keys)}
+                    for account, mark in sorted(marks.items())
+                },
+            }
+            with atomicfile.replace(self.path) as out:
+                json.dump(record, out, indent=1)
+
+
+def _read(path):
+    try:
+        with open(path) as fd:
+            record = json.load(fd)
+    except (OSError, ValueError):
+        return {}
+    if not record or record.get("format") != STORE_FORMAT:
+        return {}
+    return {
+        account: Watermark(datetime.date.fromisoformat(mark["date"]), frozenset(mark["keys"]))
+        for account, mark in record["accounts"].items()
+    }
+
+
+def _later(mark, other):
+    """The later of two marks of an account, with the keys of both if on the same date."""
+    if mark is None or other.date > mark.date:
+        return other
+    if other.date == mark.date:
+        return Watermark(mark.date, mark.keys | other.keys)
+    return mark
@@ -1,18 +1,50 @@
 from dateutil.parser import parse
 from datetime import timedelta, datetime
-from io import StringIO
 
-from beancount.ingest import importer
 from beancount.core import data
 from beancount.core import amount
-from beancount.core.number import D
 
 import csv
+import itertools
 
+import metrics
+import signatures
+from amounts import intern_currency, parse_plain
+from dates import DateParser
+from schema import RowSchema, non_empty
+from streaming import Record, StreamingImporter
 
-class WiseImporter(importer.ImporterProtocol):
+
+class WiseImporter(StreamingImporter):
     """An importer for Wise CSV files."""
 
+    columns = [
+        "TransferWise ID",
+        "Date",
+        "Amount",
+        "Currency",
+        "Description",
+        "Payment Reference",
+        "Running Balance",
+        "Exchange From",
+        "Exchange To",
+        "Exchange Rate",
+        "Payer Name",
+        "Payee Name",
+        "Payee Account Number",
+        "Merchant",
+        "Card Last Four Digits",
+        "Card Holder Full Name",
+        "Attachment",
+        "Note",
+        "Total fees",
+        "Exchange To Amount",
+    ]
+    schema = RowSchema(
+        "Date", "Amount", "Currency", "Description", "Running Balance", "Total fees"
+    )
+    signature = signatures.CsvHeader(columns)
+
     def __init__(self, account, currency="CHF", file_encoding="utf-8", manual_fixes=0):
 
         self.account = account
@@ -30,100 +62,88 @@ class WiseImporter(importer.ImporterProtocol):
         return datetime.now
 
     def identify(self, file):
-        return "wise" in file.name
-
-    def extract(self, file, existing_entries):
-        entries = []
-
-        with StringIO(file.contents()) as csvfile:
-            reader = csv.DictReader(
-                csvfile,
-                [
-                    "TransferWise ID",
-                    "Date",
-                    "Amount",
-                    "Currency",
-                    "Description",
-                    "Payment Reference",
-                    "Running Balance",
-                    "Exchange From",
-                    "Exchange To",
-                    "Exchange Rate",
-                    "Payer Name",
-                    "Payee Name",
-                    "Payee Account Number",
-                    "Merchant",
-                    "Card Last Four Digits",
-                    "Card Holder Full Name",
-                    "Attachment",
-                    "Note",
-                    "Total fees",
-                    "Exchange To Amount",
-                ],
-                delimiter=",",
-                skipinitialspace=True,
+        return signatures.identify(self, file)
+
+    def records(self, file):
+        stats = metrics.file_stats(self, file)
+        with open(file.name, encoding=self.file_encoding) as csvfile:
+            reader = non_empty(
+                csv.reader(csvfile, delimiter=",", skipinitialspace=True)
             )
             next(reader)
-            for row in reader:
-
-                book_date = parse(row["Date"]).date()
+            fields = self.schema.compile(self.columns, pad_short_rows=True)
+            parse_date = DateParser(fallback=lambda value: parse(value).date())
+
+            head = list(itertools.islice(reader, 20))
+            parse_date.sniff(fields(row)[0] for row in head if row)
+            for row in stats.rows(itertools.chain(head, reader)):
+                (
+                    date,
+                    amount_value,
+                    currency,
+                    description,
+                    running_balance,
+                    total_fees,
+                ) = fields(row)
 
-                amt = amount.Amount(D(row["Amount"]), row["Currency"])
-                description = row["Description"].strip()
+                currency = intern_currency(currency)
+                fee_number = parse_plain(total_fees)
+                description = description.strip()
                 if "issued by" in description:
                     description = description.split("issued by")[1].strip()
-
-                meta = data.new_metadata(
-                    file.name,
+                yield Record(
                     0,
-                    {
-                        "balance": data.Amount(
-                            D(row["Running Balance"]), row["Currency"]
-                        )
-                    },
-                )
-                entry = data.Transaction(
-                    meta,
-                    book_date,
-                    "*",
+                    parse_date(date),
+                    amount.Amount(parse_plain(amount_value), currency),
                     "",
                     description,
-                    data.EMPTY_SET,
-                    data.EMPTY_SET,
-                    [
-                        data.Posting(self.account, amt, None, None, None, None),
-                        data.Posting(
-                            "Expenses:TBD",
-                            -amt,
-                            None,
-                            None,
-                            None,
-                            None,
-                        ),
-                    ],
+                    None,
+                    data.Amount(parse_plain(running_balance), currency),
+                    amount.Amount(fee_number, currency) if fee_number != 0 else None,
+                )
+
+    def build(self, record, filename):
+        amt = record.amount
+        meta = data.new_metadata(filename, record.lineno, {"balance": record.balance})
+        entry = data.Transaction(
+            meta,
+            record.date,
+            "*",
+            record.payee,
+            record.narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [
+                data.Posting(self.account, amt, None, None, None, None),
+                data.Posting(
+                    "Expenses:TBD",
+                    -amt,
+                    None,
+                    None,
+                    None,
+                    None,
+                ),
+            ],
+        )
+        if record.fee is not None:
+            entry.postings.append(
+                data.Posting(
+                    self.account,
+                    -record.fee,
+                    None,
+                    None,
+                    None,
+                    None,
                 )
-                if D(row["Total fees"]) != 0:
-                    fee = amount.Amount(D(row["Total fees"]), row["Currency"])
-                    entry.postings.append(
-                        data.Posting(
-                            self.account,
-                            -fee,
-                            None,
-                            None,
-                            None,
-                            None,
-                        )
-                    )
-                    entry.postings.append(
-                        data.Posting(
-                            "Expenses:Financial:Fees",
-                            fee,
-                            None,
-                            None,
-                            None,
-                            None,
-                        )
-                    )
-                entries.append(entry)
-
-        return entries
+            )
+            entry.postings.append(
+                data.Posting(
+                    "Expenses:Financial:Fees",
+                    record.fee,
+                    None,
+                    None,
+                    None,
+                    None,
+                )
+            )
+        return entry